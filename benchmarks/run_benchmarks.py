@@ -0,0 +1,323 @@
+"""
+Loopback benchmarks for the Runyx bridge.
+
+Starts a Bridge on 127.0.0.1, drives it with a built-in load generator and
+compares throughput and latency percentiles against stored baselines.
+
+    python benchmarks/run_benchmarks.py                   # run + compare
+    python benchmarks/run_benchmarks.py --save-baseline   # record baselines
+    python benchmarks/run_benchmarks.py --only http_json ws_fanout
+
+Exits with status 1 when a scenario's throughput drops by more than
+``--tolerance`` or its p99 grows by more than ``--latency-tolerance``, or
+when it ran with other parameters than its baseline.
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import socket
+import asyncio
+import argparse
+import threading
+import http.client
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import websockets  # noqa: E402
+from runyx_bridge import Bridge, receive  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(HERE, "baseline.json")
+
+
+@receive("/bench/json")
+def bench_json(payload, meta):
+    return {"n": len(payload) if isinstance(payload, dict) else 0}
+
+
+@receive("/bench/raw", raw=True)
+def bench_raw(payload, meta):
+    return len(payload)
+
+
+@receive("/bench/base64")
+def bench_base64(payload, meta):
+    return len(base64.b64decode(payload["screenshot"]))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (seconds), in milliseconds."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index] * 1000
+
+
+def _summary(latencies, count, elapsed, errors, unit):
+    return {
+        "throughput": count / elapsed if elapsed else 0.0,
+        "unit": unit,
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+        "p99_ms": _percentile(latencies, 99),
+        "count": count,
+        "errors": errors,
+    }
+
+
+def _wait_for_port(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"bridge did not open port {port}")
+
+
+def http_load(port, path, body, headers, duration, concurrency):
+    """POST ``body`` from ``concurrency`` keep-alive connections for ``duration`` s."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def worker():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        local = []
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                conn.request("POST", path, body, headers)
+                resp = conn.getresponse()
+                resp.read()
+                if resp.status != 200:
+                    raise RuntimeError(resp.status)
+                local.append(time.perf_counter() - started)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return _summary(latencies, len(latencies), elapsed, errors[0], "req/s")
+
+
+async def _ws_fanout(port, clients, rounds):
+    url = f"ws://127.0.0.1:{port}"
+    subscribers = [await websockets.connect(f"{url}/?channel=bench") for _ in range(clients)]
+    publisher = await websockets.connect(f"{url}/?role=publisher")
+    latencies = []
+    errors = 0
+    try:
+        started = time.perf_counter()
+        for seq in range(rounds):
+            sent = time.perf_counter()
+            await publisher.send(json.dumps({"channel": "bench", "seq": seq}))
+            for ws in subscribers:
+                try:
+                    await asyncio.wait_for(ws.recv(), timeout=5)
+                    latencies.append(time.perf_counter() - sent)
+                except asyncio.TimeoutError:
+                    errors += 1
+        elapsed = time.perf_counter() - started
+    finally:
+        await publisher.close()
+        for ws in subscribers:
+            await ws.close()
+    return _summary(latencies, len(latencies), elapsed, errors, "deliveries/s")
+
+
+def ws_fanout(port, clients, rounds):
+    """Publish ``rounds`` triggers to ``clients`` subscribers; time each delivery."""
+    return asyncio.run(_ws_fanout(port, clients, rounds))
+
+
+def _scenarios(args):
+    """Return ``{name: (params, run)}``; ``params`` are stored with the results."""
+    small = json.dumps({"event": "run", "workflowId": "wf-1", "data": {"i": list(range(20))}}).encode()
+    raw = os.urandom(64 * 1024)
+    image = json.dumps({"screenshot": base64.b64encode(os.urandom(args.image_kb * 1024)).decode()}).encode()
+    json_headers = {"Content-Type": "application/json"}
+    http = {
+        "duration": args.duration,
+        "concurrency": args.concurrency,
+        "http_workers": args.http_workers,
+        "backend": args.backend,
+    }
+    return {
+        "http_json": ({**http, "payload_bytes": len(small)}, lambda: http_load(
+            args.http_port, "/bench/json", small, json_headers, args.duration, args.concurrency)),
+        "http_raw": ({**http, "payload_bytes": len(raw)}, lambda: http_load(
+            args.http_port, "/bench/raw", raw, {"Content-Type": "application/octet-stream"},
+            args.duration, args.concurrency)),
+        "http_base64": ({**http, "payload_bytes": len(image)}, lambda: http_load(
+            args.http_port, "/bench/base64", image, json_headers, args.duration, args.concurrency)),
+        "ws_fanout": ({"clients": args.clients, "rounds": args.rounds},
+                      lambda: ws_fanout(args.ws_port, args.clients, args.rounds)),
+    }
+
+
+def _param_changes(params, recorded):
+    """Describe how ``params`` differ from the ones a baseline was recorded with."""
+    if recorded is None:
+        return "baseline has no recorded parameters"
+    keys = sorted(set(params) | set(recorded))
+    return ", ".join(f"{k} {params.get(k)} (baseline {recorded.get(k)})" for k in keys if params.get(k) != recorded.get(k))
+
+
+def compare(results, baselines, tolerance, latency_tolerance):
+    """Return regression messages: throughput or p99 worse than the baseline allows.
+
+    A scenario run with other parameters than its baseline is reported
+    instead of compared.
+    """
+    problems = []
+    for name, result in results.items():
+        base = baselines.get(name)
+        if not base:
+            continue
+        if result.get("params") != base.get("params"):
+            problems.append(
+                f"{name}: not comparable, {_param_changes(result.get('params') or {}, base.get('params'))}; "
+                "rerun with the baseline's options or re-record it with --save-baseline"
+            )
+            continue
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            problems.append(
+                f"{name}: throughput {result['throughput']:.1f} < baseline {base['throughput']:.1f} {result['unit']}"
+            )
+        if base.get("p99_ms") and result["p99_ms"] and result["p99_ms"] > base["p99_ms"] * (1 + latency_tolerance):
+            problems.append(f"{name}: p99 {result['p99_ms']:.2f}ms > baseline {base['p99_ms']:.2f}ms")
+        if result["errors"]:
+            problems.append(f"{name}: {result['errors']} errors")
+    return problems
+
+
+def _print_table(results):
+    print(f"{'scenario':<14}{'throughput':>10} {'':<13}{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}{'errors':>8}")
+    for name, r in results.items():
+        print(
+            f"{name:<14}{r['throughput']:>10.1f} {r['unit']:<13}"
+            f"{r['p50_ms'] or 0:>8.2f}{r['p95_ms'] or 0:>8.2f}{r['p99_ms'] or 0:>8.2f}{r['errors']:>8}"
+        )
+
+
+def _start_bridge(args):
+    """Start the bridge with its console output silenced (unless --verbose)."""
+    bridge = Bridge(
+        host="127.0.0.1",
+        http_port=args.http_port,
+        ws_port=args.ws_port,
+        http_workers=args.http_workers,
+        http_backend=args.backend,
+        metrics=False,
+    )
+    if args.verbose:
+        bridge.start()
+    else:
+        # spawned children inherit fd 1, so point it at devnull while they start
+        sys.stdout.flush()
+        saved = os.dup(1)
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        try:
+            os.dup2(devnull, 1)
+            bridge.start()
+        finally:
+            os.dup2(saved, 1)
+            os.close(saved)
+            os.close(devnull)
+    _wait_for_port(args.http_port)
+    _wait_for_port(args.ws_port)
+    return bridge
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runyx bridge loopback benchmarks")
+    parser.add_argument("--only", nargs="*", help="scenarios to run (default: all)")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per HTTP scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="HTTP client connections")
+    parser.add_argument("--image-kb", type=int, default=512, help="decoded image size for http_base64")
+    parser.add_argument("--clients", type=int, default=50, help="WebSocket subscribers")
+    parser.add_argument("--rounds", type=int, default=200, help="WebSocket triggers to publish")
+    parser.add_argument("--http-workers", type=int, default=1)
+    parser.add_argument("--backend", default="flask", choices=("flask", "asgi"))
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="store results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative throughput drop")
+    parser.add_argument("--latency-tolerance", type=float, default=0.5, help="allowed relative p99 increase")
+    parser.add_argument("--json", help="also write results to this file")
+    parser.add_argument("--verbose", action="store_true", help="show bridge console output")
+    args = parser.parse_args(argv)
+    args.http_port = _free_port()
+    args.ws_port = _free_port()
+
+    scenarios = _scenarios(args)
+    names = args.only or list(scenarios)
+    unknown = [n for n in names if n not in scenarios]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    bridge = _start_bridge(args)
+    results = {}
+    try:
+        for name in names:
+            print(f"running {name}...", flush=True)
+            params, run = scenarios[name]
+            results[name] = {**run(), "params": params}
+    finally:
+        bridge.stop()
+
+    print()
+    _print_table(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baselines = json.load(f)
+
+    if args.save_baseline:
+        baselines.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nbaseline saved to {args.baseline}")
+        return 0
+
+    problems = compare(results, baselines, args.tolerance, args.latency_tolerance)
+    if problems:
+        print("\nREGRESSIONS:")
+        for problem in problems:
+            print(f"  - {problem}")
+        return 1
+    print("\nno regressions" if baselines else "\nno baseline yet (use --save-baseline)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,23 @@
+import time
+from runyx_bridge import Bridge, receive_image
+
+
+@receive_image("/screenshot", out_dir="received_images")
+def on_screenshot(path, info):
+    print("saved", path, info["size"], "bytes")
+
+
+def main():
+    bridge = Bridge(requests=True, websocket=False, on_background=True)
+    bridge.start()
+    print("POST screenshots (raw, base64 JSON, data URL or multipart) to http://localhost:5001/screenshot")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    bridge.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,29 @@
 """Public package exports for the Runyx bridge and runner."""
 
+from .artifacts import ArtifactStore
+from .history import RunHistory
 from .bridge import run, Bridge
 from .decorators import receive
-from .websocket_sender import send
+from .images import receive_image
+from .run_ingest import receive_runs
+from .websocket_sender import send, send_many, Sender
+from .websocket_server import broadcast, push
+from .browser_pool import BrowserPool
 from .app import RunyxApp
 
 __all__ = [
     "run",
     "Bridge",
     "receive",
+    "receive_image",
+    "receive_runs",
+    "ArtifactStore",
+    "RunHistory",
     "send",
+    "send_many",
+    "Sender",
+    "broadcast",
+    "push",
+    "BrowserPool",
     "RunyxApp",
 ]
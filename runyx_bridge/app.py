@@ -2,17 +2,23 @@
 
 import os
 import time
-import json
 import signal
 import shutil
 import tempfile
+import threading
 from colorama import Fore, init
 from .bridge import Bridge
 from .browser import BrowserSession
-from .extension import ExtensionActivator
+from .browser_pool import BrowserPool
+from .extension import ExtensionActivator, wait_until
+from . import profile_template, project_file
 
 init(autoreset=True)
 
+# seconds to wait before closing the template browser when the import
+# could not be confirmed
+TEMPLATE_SETTLE = 2.0
+
 
 def _default_extension_path():
     """
@@ -37,15 +43,25 @@ class RunyxApp:
 
     What it does:
       1) Starts Runyx Bridge (HTTP + WebSocket) in background processes
-      2) Launches Edge or Chrome using Selenium in non-headless mode
+      2) Launches Edge or Chrome using Selenium (non-headless unless headless=True)
       3) Loads the Runyx extension (unpacked folder)
       4) Imports a project JSON into the extension storage
       5) Sends Ctrl+Shift+F to activate/open the extension UI
       6) Optionally keeps the environment alive like a server
 
+    With ``profile_template=<dir>`` the first run builds a fully initialised
+    profile there (extension installed, project imported); later sessions
+    start from a copy-on-write clone of it instead of an empty profile and
+    skip steps 4-5, only waiting for the extension's service worker.
+
+    With ``browsers=N`` (N > 1) it keeps a ``BrowserPool`` of N browsers, each
+    with its own profile, ready for ``app.pool.checkout()`` / ``app.pool.session()``.
+
     Notes:
       - This is an MVP for development/testing (not production).
-      - The hotkey activation depends on OS window focus.
+      - The hotkey activation depends on OS window focus. With
+        ``headless=True`` no desktop is needed: the hotkey is skipped and
+        the UI is opened through its extension URL.
       - If you prefer, you can run the Bridge standalone and open Chrome manually.
     """
 
@@ -71,10 +87,17 @@ class RunyxApp:
         driver_log_level="ALL",
         use_system_profile=False,
         use_profile_extensions=False,
+        browsers=1,
+        profile_template=None,
+        headless=False,
+        ready_timeout=15,
+        import_runs=None,
     ):
         self.browser_name = browser
         self.import_project_path = import_project_path
         self.require_import = require_import
+        # runs history copied into the extension: None = all, 0 = none, N = newest N
+        self.import_runs = import_runs
         if extension_path is None:
             extension_path = _default_extension_path()
 
@@ -109,6 +132,13 @@ class RunyxApp:
             if profile_dir is None:
                 profile_dir = "Default"
 
+        self.browsers = max(1, int(browsers))
+        if self.browsers > 1 and use_system_profile:
+            raise ValueError("[RunyxApp] browsers > 1 needs one profile per browser; use_system_profile is not supported.")
+        if profile_template and use_system_profile:
+            raise ValueError("[RunyxApp] profile_template cannot be combined with use_system_profile.")
+        self.profile_template = os.path.abspath(profile_template) if profile_template else None
+
         self._temp_user_data_dir = None
         if user_data_dir is None and not use_system_profile:
             user_data_dir = tempfile.mkdtemp(prefix="runyx_profile_")
@@ -126,17 +156,32 @@ class RunyxApp:
             on_background=True,  # bridge always runs in background inside app
         )
 
-        self.browser = BrowserSession(
+        self.user_data_dir = user_data_dir
+        self._browser_options = dict(
             browser=self.browser_name,
             extension_path=self.extension_path,
-            user_data_dir=user_data_dir,
             profile_dir=profile_dir,
             chrome_binary=chrome_binary,
             driver_path=driver_path,
             driver_log_path=driver_log_path,
             driver_log_level=driver_log_level,
             use_profile_extensions=use_profile_extensions or use_system_profile,
+            headless=headless,
         )
+        self.headless = headless
+        self.ready_timeout = ready_timeout
+        self._import_project_id = None
+
+        self.browser = None
+        self.pool = None
+        if self.browsers > 1:
+            self.pool = BrowserPool(self._new_browser, size=self.browsers, prepare=self._prepare_browser)
+        else:
+            self.browser = BrowserSession(user_data_dir=user_data_dir, **self._browser_options)
+            if self.profile_template:
+                # cloned from the template right before each launch
+                self.user_data_dir = os.path.join(user_data_dir, "profile")
+                self.browser.user_data_dir = self.user_data_dir
 
         self.activator = ExtensionActivator()
         self.auto_activate = auto_activate
@@ -147,13 +192,19 @@ class RunyxApp:
         self._prev_sigint = None
         self._prev_sigterm = None
         self._stopping = False
+        # the activation hotkey goes to the focused window: one browser at a time
+        self._activation_lock = threading.Lock()
+        self._browser_exited = threading.Event()
 
         print(Fore.CYAN + "[RunyxApp] extension path:")
         print(Fore.GREEN + f"  {self.extension_path}")
         print(Fore.CYAN + "[RunyxApp] browser:")
-        print(Fore.GREEN + f"  {self.browser_name}")
+        print(Fore.GREEN + f"  {self.browser_name}" + (f" x{self.browsers}" if self.pool else ""))
         print(Fore.CYAN + "[RunyxApp] browser user data dir:")
         print(Fore.GREEN + f"  {user_data_dir}")
+        if self.profile_template:
+            print(Fore.CYAN + "[RunyxApp] profile template:")
+            print(Fore.GREEN + f"  {self.profile_template}")
         print(Fore.CYAN + "[RunyxApp] driver log:")
         print(Fore.GREEN + f"  {driver_log_path}")
 
@@ -193,21 +244,18 @@ class RunyxApp:
         print(Fore.CYAN + "[RunyxApp] starting bridge (HTTP/WS)...")
         self.bridge.start()
 
-        print(Fore.CYAN + "[RunyxApp] starting browser (selenium, non-headless)...")
-        driver = self.browser.start()
+        if self.profile_template:
+            self.build_profile_template()
 
-        self._run_activation_flow(driver)
-
-        loaded = self.browser.extension_loaded()
-        if loaded is False:
-            print(Fore.YELLOW + "[RunyxApp] extension not detected in profile.")
-            print(Fore.YELLOW + "  Chrome may be blocking --load-extension in this build.")
-            print(Fore.YELLOW + "  Try use_system_profile=True with a profile that already has Runyx installed.")
-
-        if self.auto_activate:
-            ext_id = self.browser.get_extension_id()
-            if ext_id:
-                self.activator.activate(driver, extension_id=ext_id, browser=self.browser_name, send_hotkey=False)
+        if self.pool is not None:
+            print(Fore.CYAN + f"[RunyxApp] starting {self.browsers} browsers (selenium, {self._mode_label()})...")
+            self.pool.start()
+        else:
+            print(Fore.CYAN + f"[RunyxApp] starting browser (selenium, {self._mode_label()})...")
+            self._clone_template(self.browser)
+            driver = self.browser.start()
+            self._prepare_browser(self.browser, driver)
+            self._watch_browser()
 
         self._started = True
 
@@ -224,15 +272,15 @@ class RunyxApp:
         print(Fore.CYAN + "[RunyxApp] running (Ctrl+C to stop)...")
         try:
             while not self._stopping:
-                if not self.browser.is_alive():
-                    print(Fore.YELLOW + "[RunyxApp] browser closed. restarting...")
-                    driver = self.browser.start()
-                    self._run_activation_flow(driver)
-                    if self.auto_activate:
-                        ext_id = self.browser.get_extension_id()
-                        if ext_id:
-                            self.activator.activate(driver, extension_id=ext_id, browser=self.browser_name, send_hotkey=False)
-                time.sleep(1)
+                # set by the browser watcher (pooled browsers are replaced by the
+                # pool itself); the timeout only keeps Ctrl+C responsive
+                if not self._browser_exited.wait(1) or self._stopping:
+                    continue
+                print(Fore.YELLOW + "[RunyxApp] browser closed. restarting...")
+                self._clone_template(self.browser)
+                driver = self.browser.start()
+                self._prepare_browser(self.browser, driver)
+                self._watch_browser()
         except KeyboardInterrupt:
             self.stop()
 
@@ -241,7 +289,10 @@ class RunyxApp:
         print(Fore.CYAN + "\n[RunyxApp] stopping...")
         self._stopping = True
         try:
-            self.browser.stop()
+            if self.pool is not None:
+                self.pool.stop()
+            else:
+                self.browser.stop()
         except Exception:
             pass
         try:
@@ -256,8 +307,120 @@ class RunyxApp:
         self._started = False
         self._restore_signal_handlers()
 
+    def _mode_label(self):
+        return "headless" if self.headless else "non-headless"
+
+    def _watch_browser(self):
+        """Wake ``run_forever`` as soon as the browser exits."""
+        self._browser_exited.clear()
+        self.browser.watch(lambda _session: self._browser_exited.set())
+
+    def _new_browser(self, slot):
+        """Build the pool's browser for ``slot`` with its own profile folder."""
+        session = BrowserSession(
+            user_data_dir=os.path.join(self.user_data_dir, f"slot-{slot}"),
+            **self._browser_options,
+        )
+        self._clone_template(session)
+        return session
+
+    def build_profile_template(self, force=False):
+        """
+        Build the profile template unless an up-to-date one exists.
+
+        Launches a browser on the template folder, activates the extension
+        (which imports the project), then quits it cleanly so the profile is
+        flushed to disk. The template is rebuilt when the browser, the
+        extension or the project JSON changes.
+        """
+        expected = profile_template.fingerprint(
+            self.browser_name, self.extension_path, self.import_project_path
+        )
+        if not force and profile_template.is_ready(self.profile_template, expected):
+            return False
+
+        print(Fore.CYAN + "[RunyxApp] building profile template (one-time)...")
+        shutil.rmtree(self.profile_template, ignore_errors=True)
+        session = BrowserSession(user_data_dir=self.profile_template, **self._browser_options)
+        try:
+            driver = session.start()
+            timings = self._prepare_browser(session, driver)
+            if timings.get("import") is None:
+                # import not confirmed (no UI opened): give the service worker time
+                time.sleep(TEMPLATE_SETTLE)
+        finally:
+            session.stop(timeout=15)
+        profile_template.finalize(self.profile_template, expected)
+        print(Fore.GREEN + f"[RunyxApp] profile template ready: {self.profile_template}")
+        return True
+
+    def _clone_template(self, session):
+        """Give ``session`` a fresh clone of the profile template."""
+        if not self.profile_template:
+            return
+        started = time.perf_counter()
+        method = profile_template.clone(self.profile_template, session.user_data_dir)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(Fore.CYAN + f"[RunyxApp] profile cloned ({method}) in {elapsed:.0f}ms")
+
+    def _prepare_browser(self, session, driver):
+        """
+        Activate the extension in a freshly launched browser.
+
+        Each phase waits for its readiness signal (service worker running,
+        ``ui.html`` loaded, project in storage) up to ``ready_timeout``
+        seconds; the seconds spent are recorded in ``session.timings``
+        (None when a signal never came). Browsers cloned from the profile
+        template already have the extension activated and the project
+        imported, so they only wait for the service worker.
+        """
+        timings = session.timings
+        ext_id = session.get_extension_id()
+        cloned = bool(self.profile_template) and (
+            os.path.abspath(session.user_data_dir) != self.profile_template
+        )
+
+        loaded = None
+        if ext_id:
+            timings["service_worker"] = self.activator.wait_for_service_worker(driver, ext_id, self.ready_timeout)
+            loaded = timings["service_worker"] is not None
+        if loaded is None:
+            loaded = session.extension_loaded()
+        if loaded is False:
+            print(Fore.YELLOW + "[RunyxApp] extension not detected in profile.")
+            print(Fore.YELLOW + "  Chrome may be blocking --load-extension in this build.")
+            print(Fore.YELLOW + "  Try use_system_profile=True with a profile that already has Runyx installed.")
+
+        if not cloned:
+            self._activate_extension(driver, ext_id, timings)
+
+        phases = ", ".join(
+            f"{name} {'timeout' if secs is None else f'{secs * 1000:.0f}ms'}" for name, secs in timings.items()
+        )
+        print(Fore.CYAN + f"[RunyxApp] browser ready: {phases}")
+        return timings
+
+    def _activate_extension(self, driver, ext_id, timings):
+        """Send the hotkey, open the UI and wait for the project import."""
+        if not self.headless:
+            # no window to focus headless: the UI is opened by URL below
+            with self._activation_lock:
+                self._run_activation_flow(driver)
+
+        if self.auto_activate:
+            if ext_id:
+                opened = self.activator.activate(driver, extension_id=ext_id, browser=self.browser_name, send_hotkey=False)
+                if opened:
+                    timings["ui"] = self.activator.wait_for_ui(driver, self.ready_timeout)
+                    if self._import_project_id and timings["ui"] is not None:
+                        timings["import"] = self.activator.wait_for_project(
+                            driver, self._import_project_id, self.ready_timeout
+                        )
+            elif self.headless:
+                print(Fore.YELLOW + "[RunyxApp] extension id unknown; headless activation skipped.")
+
     def _prepare_import_file(self):
-        """Validate and copy the project JSON into extension/local/import.json."""
+        """Validate the project JSON and copy it into extension/local/import.json in one pass."""
         if not self.import_project_path:
             return
 
@@ -265,46 +428,17 @@ class RunyxApp:
         if not os.path.isfile(src):
             raise FileNotFoundError(f"[RunyxApp] import JSON not found: {src}")
 
-        data = self._validate_import_json(src)
-        project = data.get("project", {})
-        workflows = data.get("workflows", [])
-        if not project or not workflows:
-            raise ValueError("[RunyxApp] import JSON is missing project/workflows.")
-
         local_dir = os.path.join(self.extension_path, "local")
         os.makedirs(local_dir, exist_ok=True)
         dest = os.path.join(local_dir, "import.json")
-        shutil.copyfile(src, dest)
-
-    def _validate_import_json(self, path):
-        """Basic schema validation for a project export JSON."""
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except Exception as exc:
-            raise ValueError(f"[RunyxApp] failed to parse import JSON: {path}") from exc
-
-        if not isinstance(data, dict):
-            raise ValueError("[RunyxApp] import JSON must be an object.")
-
-        project = data.get("project")
-        workflows = data.get("workflows")
-        if not isinstance(project, dict) or not isinstance(workflows, list):
-            raise ValueError("[RunyxApp] import JSON must include { project, workflows }.")
-
-        if not isinstance(project.get("id"), str) or not project.get("id"):
-            raise ValueError("[RunyxApp] import JSON project.id must be a string.")
-
-        for wf in workflows:
-            if not isinstance(wf, dict) or not isinstance(wf.get("id"), str):
-                raise ValueError("[RunyxApp] each workflow must have a string id.")
-
-        return data
+        summary = project_file.copy_project(src, dest, keep_runs=self.import_runs)
+        self._import_project_id = summary["project_id"]
+        if summary["runs"] != summary["runs_kept"]:
+            print(Fore.CYAN + f"[RunyxApp] imported {summary['runs_kept']} of {summary['runs']} runs")
 
     def _run_activation_flow(self, driver):
-        """Wait briefly, focus the browser window, then send the activation hotkey."""
+        """Focus the browser window, then send the activation hotkey."""
         try:
-            time.sleep(1)
             self._send_hotkey(driver)
         except Exception:
             pass
@@ -330,7 +464,7 @@ class RunyxApp:
                     h = rect.get("height", 0)
                     if w and h:
                         pyautogui.click(x + w / 2, y + h / 2)
-                    time.sleep(0.2)
+                    wait_until(lambda: driver.execute_script("return document.hasFocus()"), 0.5)
                 except Exception:
                     pass
             pyautogui.hotkey("ctrl", "shift", "f")
@@ -0,0 +1,201 @@
+"""Content-addressed artifact store: each unique upload is written once."""
+
+import os
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from . import codec
+
+_CHUNK_SIZE = 64 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    content_type TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS refs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    digest TEXT NOT NULL REFERENCES blobs(digest),
+    run_id TEXT,
+    workflow_id TEXT,
+    path TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS refs_digest ON refs(digest);
+CREATE INDEX IF NOT EXISTS refs_run ON refs(run_id);
+CREATE INDEX IF NOT EXISTS refs_workflow ON refs(workflow_id);
+"""
+
+# reference fields looked up in meta, then in meta["query"] / meta["headers"]
+_REF_KEYS = {
+    "run_id": ("run_id", "runId", "X-Runyx-Run-Id"),
+    "workflow_id": ("workflow_id", "workflowId", "X-Runyx-Workflow-Id"),
+}
+
+
+def _lookup(meta, names):
+    """Return the first non-empty value for ``names`` in meta, query or headers."""
+    for source in (meta, meta.get("query") or {}, meta.get("headers") or {}):
+        for name in names:
+            value = source.get(name)
+            if value not in (None, ""):
+                return str(value)
+    return None
+
+
+class ArtifactStore:
+    """
+    Store upload bodies under their SHA-256 digest, once per unique content.
+
+    Blobs live in ``root/blobs/<aa>/<digest>``; a small SQLite index in
+    ``root/index.sqlite3`` records which run/workflow/path referenced each
+    blob and when. Re-sending identical bytes only adds an index row.
+    """
+    def __init__(self, root="artifacts"):
+        self.root = os.path.abspath(root)
+        self.blob_dir = os.path.join(self.root, "blobs")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(self.root, "index.sqlite3"),
+            timeout=30,
+            check_same_thread=False,
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def path(self, digest):
+        """Return the file path of a blob (whether or not it exists)."""
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def exists(self, digest):
+        """Return True when a blob with this digest is stored."""
+        return os.path.exists(self.path(digest))
+
+    def open(self, digest):
+        """Open a stored blob for binary reading."""
+        return open(self.path(digest), "rb")
+
+    def _body(self, payload, meta):
+        """Return bytes for in-memory payloads, or None for file-like ones."""
+        if isinstance(payload, (bytes, bytearray, memoryview)):
+            return bytes(payload)
+        if isinstance(payload, str):
+            return payload.encode("utf-8")
+        if hasattr(payload, "read"):
+            return None
+        # decoded JSON: hash the bytes the client actually sent when available
+        body = meta.get("body") if meta else None
+        if body is not None:
+            return bytes(body)
+        return codec.json_dumps(payload)
+
+    def _write_bytes(self, digest, data):
+        """Write ``data`` under ``digest`` unless it is already stored."""
+        target = self.path(digest)
+        if os.path.exists(target):
+            return False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".part")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, target)
+        return True
+
+    def _write_stream(self, stream):
+        """Hash and copy a file-like body in one pass; return (digest, size, new)."""
+        if hasattr(stream, "seek"):
+            stream.seek(0)
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=self.blob_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = stream.read(_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    sha.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            digest = sha.hexdigest()
+            target = self.path(digest)
+            if os.path.exists(target):
+                return digest, size, False
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp, target)
+            return digest, size, True
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def put(self, payload, meta=None, run_id=None, workflow_id=None):
+        """
+        Store ``payload`` and record a reference to it.
+
+        ``payload`` may be bytes, str, a file-like object (``stream=True``
+        routes) or a decoded JSON value (the raw ``meta["body"]`` is stored
+        then). ``run_id``/``workflow_id`` default to ``runId``/``workflowId``
+        found in meta, the query string or ``X-Runyx-Run-Id`` /
+        ``X-Runyx-Workflow-Id`` headers. Returns
+        ``{"digest", "size", "new"}``.
+        """
+        meta = meta if meta is not None else {}
+        data = self._body(payload, meta)
+        if data is None:
+            digest, size, new = self._write_stream(payload)
+        else:
+            digest, size = hashlib.sha256(data).hexdigest(), len(data)
+            new = self._write_bytes(digest, data)
+
+        run_id = run_id or _lookup(meta, _REF_KEYS["run_id"])
+        workflow_id = workflow_id or _lookup(meta, _REF_KEYS["workflow_id"])
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR IGNORE INTO blobs (digest, size, content_type, created_at) VALUES (?, ?, ?, ?)",
+                (digest, size, meta.get("content_type"), now),
+            )
+            self._db.execute(
+                "INSERT INTO refs (digest, run_id, workflow_id, path, created_at) VALUES (?, ?, ?, ?, ?)",
+                (digest, run_id, workflow_id, meta.get("path"), now),
+            )
+        return {"digest": digest, "size": size, "new": new}
+
+    def refs(self, digest=None, run_id=None, workflow_id=None, limit=100):
+        """List references (newest first), optionally filtered."""
+        clauses, params = [], []
+        for column, value in (("digest", digest), ("run_id", run_id), ("workflow_id", workflow_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT digest, run_id, workflow_id, path, created_at FROM refs {where} "
+                "ORDER BY id DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        keys = ("digest", "run_id", "workflow_id", "path", "created_at")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def stats(self):
+        """Return blob/reference counts and bytes stored vs. bytes received."""
+        with self._lock:
+            blobs, stored = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs"
+            ).fetchone()
+            refs, received = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(b.size), 0) FROM refs r JOIN blobs b USING (digest)"
+            ).fetchone()
+        return {"blobs": blobs, "refs": refs, "bytes_stored": stored, "bytes_received": received}
+
+    def close(self):
+        """Close the reference index; stored blobs are left in place."""
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,330 @@
+"""ASGI application serving @receive routes from an event loop."""
+
+import io
+import time
+import uuid
+import asyncio
+import inspect
+import tempfile
+import functools
+from werkzeug.exceptions import ClientDisconnected, HTTPException, InternalServerError
+from werkzeug.routing import Map, Rule
+from werkzeug.wrappers import Request, Response
+from .decorators import (
+    _ROUTES,
+    SPOOL_THRESHOLD,
+    _spool,
+    _iter_stream,
+    _read_payload,
+    _build_meta,
+    _make_response,
+    _spool_threshold,
+    _submit,
+    _call_handler,
+)
+from . import codec, metrics, profiling
+from .compression import decode_environ
+from .http_server import _print_banner
+
+_CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-methods", b"*"),
+    (b"access-control-allow-headers", b"*"),
+]
+
+
+def _build_environ(scope):
+    """Translate an ASGI HTTP scope into a WSGI environ for werkzeug."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"],
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.input": io.BytesIO(),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.errors": io.StringIO(),
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name == "CONTENT_LENGTH":
+            environ["CONTENT_LENGTH"] = value
+        else:
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _attach_body(environ, body):
+    """Point the environ at a fully received body file."""
+    # the body is already complete, so describe it by its real size
+    body.seek(0, io.SEEK_END)
+    environ["CONTENT_LENGTH"] = str(body.tell())
+    body.seek(0)
+    environ.pop("HTTP_TRANSFER_ENCODING", None)
+    environ["wsgi.input"] = body
+
+
+async def _read_body(receive, threshold):
+    """Collect the request body, spilling to disk past ``threshold`` bytes.
+
+    Raises ``ClientDisconnected`` when the client leaves before the body ends.
+    """
+    body = tempfile.SpooledTemporaryFile(max_size=threshold)
+    try:
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise ClientDisconnected()
+            body.write(message.get("body", b""))
+            if not message.get("more_body", False):
+                return body
+    except BaseException:
+        body.close()
+        raise
+
+
+async def _send_response(send, response):
+    """Write a werkzeug response through the ASGI send callable."""
+    headers = [
+        (name.lower().encode("latin-1"), value.encode("latin-1"))
+        for name, value in response.headers.items()
+    ]
+    await send({
+        "type": "http.response.start",
+        "status": response.status_code,
+        "headers": headers + _CORS_HEADERS,
+    })
+    await send({"type": "http.response.body", "body": response.get_data()})
+
+
+class _AsgiWebSocket:
+    """Present an ASGI websocket connection the way ``Hub.handle`` expects."""
+    def __init__(self, scope, receive, send):
+        query = scope.get("query_string", b"").decode("latin-1")
+        self.id = uuid.uuid4()
+        self.path = scope["path"] + (f"?{query}" if query else "")
+        self._receive = receive
+        self._send = send
+
+    async def accept(self):
+        """Complete the handshake; return False if the client went away."""
+        message = await self._receive()
+        if message["type"] != "websocket.connect":
+            return False
+        await self._send({"type": "websocket.accept"})
+        return True
+
+    async def __aiter__(self):
+        while True:
+            message = await self._receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("text") is not None:
+                yield message["text"]
+            elif message.get("bytes") is not None:
+                yield message["bytes"]
+
+    async def send(self, message):
+        if isinstance(message, (bytes, bytearray)):
+            await self._send({"type": "websocket.send", "bytes": bytes(message)})
+        else:
+            await self._send({"type": "websocket.send", "text": message})
+
+    async def close(self, code=1000, reason=""):
+        await self._send({"type": "websocket.close", "code": code, "reason": reason})
+
+
+async def _call_handler_async(route, payload, meta):
+    """Await coroutine handlers; run sync ones on the route's pool or the default executor."""
+    fn = route["handler"]
+    if inspect.iscoroutinefunction(fn):
+        return await profiling.wrap_async(route["path"], fn)(payload, meta)
+    pool = route["pool"]
+    if pool is None:
+        call = profiling.wrap(route["path"], functools.partial(_call_handler, fn))
+        return await asyncio.get_running_loop().run_in_executor(None, call, payload, meta)
+    outcome = await asyncio.wrap_future(_submit(route, fn, payload, meta))
+    return pool.result(outcome)
+
+
+async def _serve_route(route, environ, receive, send):
+    """Admit, read, decode and dispatch one request to a @receive route."""
+    pool = route["pool"]
+    admitted = False
+    body = None
+    try:
+        if pool is not None:
+            # reject before reading the body when the route is saturated
+            pool.acquire()
+            admitted = True
+        body = await _read_body(receive, _spool_threshold(route))
+        _attach_body(environ, body)
+        req = Request(environ)
+        if decode_environ(environ) and route.get("stream"):
+            # swap the compressed spool for the decoded one
+            decoded = _spool(_iter_stream(req.stream), _spool_threshold(route))
+            body.close()
+            body = decoded
+        if route.get("stream"):
+            payload = body
+        else:
+            payload = _read_payload(req, raw=route.get("raw"))
+        meta = _build_meta(req, stream=route.get("stream"))
+        result = await _call_handler_async(route, payload, meta)
+    except ClientDisconnected:
+        # nobody is left to answer; a truncated body never reaches the handler
+        return
+    except HTTPException as exc:
+        await _send_response(send, exc.get_response(environ))
+        return
+    except Exception:
+        await _send_response(send, InternalServerError().get_response(environ))
+        return
+    finally:
+        # also runs when the client disconnects and the task is cancelled
+        if admitted:
+            pool.release()
+        if body is not None:
+            body.close()
+
+    await _send_response(send, _make_response(result, req))
+
+
+def create_asgi_app(hub=None, metrics_endpoint=False, profile_endpoint=False):
+    """Build an ASGI app exposing every registered @receive route.
+
+    When ``hub`` is given, WebSocket connections on any path are served by it.
+    With ``metrics_endpoint`` the app also answers ``GET /metrics``, with
+    ``profile_endpoint`` it serves the profiling admin endpoint.
+    """
+    url_map = Map([
+        Rule(route["path"], endpoint=index, methods=route["methods"])
+        for index, route in enumerate(_ROUTES)
+    ])
+
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+        if scope["type"] == "websocket" and hub is not None:
+            websocket = _AsgiWebSocket(scope, receive, send)
+            if await websocket.accept():
+                await hub.handle(websocket)
+            return
+
+        if scope["type"] != "http":
+            return
+
+        environ = _build_environ(scope)
+
+        if metrics_endpoint and scope["path"] == "/metrics" and scope["method"] == "GET":
+            response = Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+            await _send_response(send, response)
+            return
+
+        if profile_endpoint and scope["path"] == profiling.ADMIN_PATH:
+            try:
+                body = await _read_body(receive, SPOOL_THRESHOLD)
+            except ClientDisconnected:
+                return
+            try:
+                body.seek(0)
+                status, result = profiling.admin(scope["method"], body.read())
+            finally:
+                body.close()
+            response = Response(codec.json_dumps({"ok": status < 400, "result": result}),
+                                status=status, mimetype=codec.JSON)
+            await _send_response(send, response)
+            return
+
+        try:
+            endpoint, _ = url_map.bind_to_environ(environ).match()
+        except HTTPException as exc:
+            await _send_response(send, exc.get_response(environ))
+            return
+
+        if environ["REQUEST_METHOD"] == "OPTIONS":
+            await _send_response(send, Response(status=204))
+            return
+
+        route = _ROUTES[endpoint]
+        started = time.perf_counter()
+        size = environ.get("CONTENT_LENGTH")
+        status = [500]
+
+        async def send_and_record(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await _serve_route(route, environ, receive, send_and_record)
+        finally:
+            metrics.observe_request(
+                route["path"],
+                environ["REQUEST_METHOD"],
+                status[0],
+                time.perf_counter() - started,
+                int(size) if size else None,
+            )
+
+    return app
+
+
+def start_asgi_server(
+    host,
+    port,
+    sock=None,
+    worker_id=0,
+    workers=1,
+    metrics_dir=None,
+    profile_dir=None,
+):
+    """Serve @receive routes with uvicorn on an asyncio event loop."""
+    try:
+        import uvicorn
+    except ImportError as exc:
+        raise RuntimeError(
+            "[HTTP] http_backend='asgi' requires uvicorn: pip install uvicorn"
+        ) from exc
+
+    metrics.configure(metrics_dir)
+    profiling.configure(profile_dir, http=True)
+    app = create_asgi_app(
+        metrics_endpoint=metrics_dir is not None,
+        profile_endpoint=profile_dir is not None,
+    )
+
+    if worker_id == 0:
+        _print_banner(port, workers=workers, backend="asgi")
+
+    config = uvicorn.Config(
+        app,
+        host=host,
+        port=port,
+        log_level="error",
+        access_log=False,
+    )
+    server = uvicorn.Server(config)
+    try:
+        server.run(sockets=[sock] if sock is not None else None)
+    except KeyboardInterrupt:
+        pass
@@ -1,8 +1,13 @@
 """Bridge process manager for HTTP and WebSocket servers."""
 
+import os
+import shutil
+import tempfile
 import multiprocessing
-from .http_server import start_http_server
+from .http_server import start_http_server, create_http_socket
+from .asgi import start_asgi_server
 from .websocket_server import start_ws_server
+from .unified import start_unified_server
 
 
 def _safe_set_start_method():
@@ -14,7 +19,24 @@ def _safe_set_start_method():
 
 
 class Bridge:
-    """Start and stop HTTP and WebSocket servers in child processes."""
+    """
+    Start and stop HTTP and WebSocket servers in child processes.
+
+    ``mode="processes"`` (default) runs HTTP and WebSocket in separate
+    processes. ``mode="unified"`` runs both on one asyncio loop in a single
+    process, which lets @receive handlers reach WebSocket clients in memory
+    via ``broadcast``/``push``.
+
+    ``metrics=True`` (off by default) makes every child process share its
+    counters through a temporary directory and the HTTP server answer
+    ``GET /metrics`` with the aggregate in the Prometheus text format. The
+    endpoint is unauthenticated and served on ``host``.
+
+    With ``profiling=True`` the HTTP server also serves
+    ``/_runyx/profile``, which starts a bounded sampling or cProfile session
+    for a route or the WebSocket loop in every child process; results are
+    written to ``profile_dir``.
+    """
     def __init__(
         self,
         host="0.0.0.0",
@@ -23,6 +45,14 @@ class Bridge:
         requests=True,
         websocket=True,
         on_background=True,
+        http_workers=1,
+        http_backend="flask",
+        ws_queue_size=256,
+        ws_slow_consumer="drop",
+        mode="processes",
+        metrics=False,
+        profiling=False,
+        profile_dir="profiles",
     ):
         self.host = host
         self.http_port = http_port
@@ -30,7 +60,17 @@ class Bridge:
         self.requests = requests
         self.websocket = websocket
         self.on_background = on_background
+        self.http_workers = max(1, int(http_workers))
+        self.http_backend = http_backend
+        self.ws_queue_size = ws_queue_size
+        self.ws_slow_consumer = ws_slow_consumer
+        self.mode = mode
+        self.metrics = metrics
+        self.profiling = profiling
+        self.profile_dir = profile_dir
         self.processes = []
+        self._http_socket = None
+        self._metrics_dir = None
 
     def start(self):
         """Start the requested servers and optionally block."""
@@ -39,21 +79,72 @@ class Bridge:
         if not self.requests and not self.websocket:
             raise RuntimeError("At least one of requests or websocket must be True")
 
+        if self.http_backend == "asgi":
+            http_target = start_asgi_server
+        elif self.http_backend == "flask":
+            http_target = start_http_server
+        else:
+            raise ValueError("http_backend must be 'flask' or 'asgi'")
+
+        if self.mode not in ("processes", "unified"):
+            raise ValueError("mode must be 'processes' or 'unified'")
+        if self.mode == "unified" and self.http_workers > 1:
+            raise ValueError("mode='unified' runs a single process; use http_workers=1")
+
         self.processes = []
+        if self.metrics:
+            self._metrics_dir = tempfile.mkdtemp(prefix="runyx-metrics-")
+        profile_dir = os.path.abspath(self.profile_dir) if self.profiling else None
 
-        if self.requests:
+        if self.mode == "unified":
+            p_unified = multiprocessing.Process(
+                target=start_unified_server,
+                args=(self.host, self.http_port, self.ws_port),
+                kwargs={
+                    "requests": self.requests,
+                    "websocket": self.websocket,
+                    "queue_size": self.ws_queue_size,
+                    "slow_consumer": self.ws_slow_consumer,
+                    "metrics_dir": self._metrics_dir,
+                    "profile_dir": profile_dir,
+                },
+                daemon=self.on_background,
+            )
+            self.processes.append(p_unified)
+            p_unified.start()
+        elif self.requests and self.http_workers > 1:
+            # prefork: every worker accepts from the same inherited socket
+            self._http_socket = create_http_socket(self.host, self.http_port)
+            for worker_id in range(self.http_workers):
+                p_http = multiprocessing.Process(
+                    target=http_target,
+                    args=(self.host, self.http_port),
+                    kwargs={
+                        "sock": self._http_socket,
+                        "worker_id": worker_id,
+                        "workers": self.http_workers,
+                        "metrics_dir": self._metrics_dir,
+                        "profile_dir": profile_dir,
+                    },
+                    daemon=self.on_background,
+                )
+                self.processes.append(p_http)
+                p_http.start()
+        elif self.requests:
             p_http = multiprocessing.Process(
-                target=start_http_server,
+                target=http_target,
                 args=(self.host, self.http_port),
+                kwargs={"metrics_dir": self._metrics_dir, "profile_dir": profile_dir},
                 daemon=self.on_background,
             )
             self.processes.append(p_http)
             p_http.start()
 
-        if self.websocket:
+        if self.websocket and self.mode != "unified":
             p_ws = multiprocessing.Process(
                 target=start_ws_server,
-                args=(self.host, self.ws_port),
+                args=(self.host, self.ws_port, self.ws_queue_size, self.ws_slow_consumer),
+                kwargs={"metrics_dir": self._metrics_dir, "profile_dir": profile_dir},
                 daemon=self.on_background,
             )
             self.processes.append(p_ws)
@@ -83,6 +174,15 @@ class Bridge:
                         p.kill()
             except Exception:
                 pass
+        if self._http_socket is not None:
+            try:
+                self._http_socket.close()
+            except Exception:
+                pass
+            self._http_socket = None
+        if self._metrics_dir is not None:
+            shutil.rmtree(self._metrics_dir, ignore_errors=True)
+            self._metrics_dir = None
 
 
 def run(
@@ -92,6 +192,14 @@ def run(
     requests=True,
     websocket=True,
     on_background=True,
+    http_workers=1,
+    http_backend="flask",
+    ws_queue_size=256,
+    ws_slow_consumer="drop",
+    mode="processes",
+    metrics=False,
+    profiling=False,
+    profile_dir="profiles",
 ):
     """Convenience helper to start the Bridge with defaults."""
     b = Bridge(
@@ -101,5 +209,13 @@ def run(
         requests=requests,
         websocket=websocket,
         on_background=on_background,
+        http_workers=http_workers,
+        http_backend=http_backend,
+        ws_queue_size=ws_queue_size,
+        ws_slow_consumer=ws_slow_consumer,
+        mode=mode,
+        metrics=metrics,
+        profiling=profiling,
+        profile_dir=profile_dir,
     )
     return b.start()
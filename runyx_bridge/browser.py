@@ -3,7 +3,12 @@
 import os
 import time
 import json
+import base64
+import hashlib
 import threading
+import urllib.request
+from functools import lru_cache
+from colorama import Fore
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options as ChromeOptions
 from selenium.webdriver.chrome.service import Service as ChromeService
@@ -11,6 +16,75 @@ from selenium.webdriver.edge.options import Options as EdgeOptions
 from selenium.webdriver.edge.service import Service as EdgeService
 
 
+def _id_from_bytes(data):
+    """Chromium's ID scheme: first 16 bytes of SHA-256, hex digits mapped to a-p."""
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    return "".join(chr(ord("a") + int(c, 16)) for c in digest)
+
+
+@lru_cache(maxsize=None)
+def extension_id_for(extension_path):
+    """
+    Compute the ID Chromium assigns to an unpacked extension, without a browser.
+
+    A manifest ``key`` (base64 public key) fixes the ID; otherwise it is
+    derived from the absolute path: UTF-8 bytes on POSIX, UTF-16-LE with an
+    upper-case drive letter on Windows. Results are cached per path.
+    """
+    path = os.path.realpath(os.path.abspath(extension_path))
+    try:
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8-sig") as f:
+            key = json.load(f).get("key")
+    except (OSError, ValueError, AttributeError):
+        key = None
+    if isinstance(key, str) and key.strip():
+        try:
+            return _id_from_bytes(base64.b64decode(key.strip()))
+        except ValueError:
+            pass
+    if os.name == "nt":
+        if len(path) > 1 and path[1] == ":":
+            path = path[0].upper() + path[1:]
+        return _id_from_bytes(path.encode("utf-16-le"))
+    return _id_from_bytes(path.encode("utf-8"))
+
+
+def _devtools_url(driver, timeout=2):
+    """Return the browser-level DevTools websocket URL of a Chromium driver."""
+    try:
+        caps = driver.capabilities or {}
+    except Exception:
+        return None
+    for key in ("goog:chromeOptions", "ms:edgeOptions"):
+        address = (caps.get(key) or {}).get("debuggerAddress")
+        if not address:
+            continue
+        try:
+            with urllib.request.urlopen(f"http://{address}/json/version", timeout=timeout) as resp:
+                return json.loads(resp.read()).get("webSocketDebuggerUrl")
+        except Exception:
+            return None
+    return None
+
+
+def _wait_devtools_close(url):
+    """Block until the DevTools socket closes; False if it cannot be opened."""
+    from websockets.sync.client import connect
+
+    try:
+        ws = connect(url, open_timeout=5, ping_interval=None, max_size=None)
+    except Exception:
+        return False
+    try:
+        # no domains are enabled, so the browser sends nothing until it exits
+        while True:
+            ws.recv()
+    except Exception:
+        return True
+    finally:
+        ws.close()
+
+
 class BrowserSession:
     """Manage a Selenium driver session for Edge or Chrome."""
     def __init__(
@@ -25,6 +99,8 @@ class BrowserSession:
         driver_log_level="ALL",
         use_profile_extensions=False,
         extra_args=None,
+        headless=False,
+        window_size=(1920, 1080),
     ):
         self.browser = browser
         self.extension_path = extension_path
@@ -36,17 +112,24 @@ class BrowserSession:
         self.driver_log_level = driver_log_level
         self.use_profile_extensions = use_profile_extensions
         self.extra_args = extra_args or []
+        self.headless = headless
+        self.window_size = window_size
         self.driver = None
+        # seconds per startup phase of the latest launch ("launch", then activation phases)
+        self.timings = {}
+        self._exited = None
 
     def start(self):
         """Start a Selenium driver with the configured options."""
+        started = time.perf_counter()
         if self.browser == "edge":
             opts = EdgeOptions()
             opts.use_chromium = True
         else:
             opts = ChromeOptions()
 
-        # NON-HEADLESS (core do seu MVP)
+        # non-headless by default (core do seu MVP); headless=True uses the new
+        # headless mode, which still runs unpacked extensions
 
         if self.chrome_binary:
             opts.binary_location = self.chrome_binary
@@ -73,7 +156,13 @@ class BrowserSession:
         opts.add_argument("--disable-gpu")
         opts.add_argument("--no-sandbox")
         opts.add_argument("--disable-dev-shm-usage")
-        opts.add_argument("--start-maximized")
+        if self.headless:
+            opts.add_argument("--headless=new")
+            if self.window_size:
+                width, height = self.window_size
+                opts.add_argument(f"--window-size={width},{height}")
+        else:
+            opts.add_argument("--start-maximized")
 
         for a in self.extra_args:
             opts.add_argument(a)
@@ -101,33 +190,117 @@ class BrowserSession:
         else:
             self.driver = webdriver.Chrome(service=service, options=opts)
 
+        self._exited = None
+        self.timings = {"launch": time.perf_counter() - started}
         return self.driver
 
+    def watch(self, on_exit, poll_interval=1.0):
+        """
+        Call ``on_exit(self)`` once, as soon as this launch's browser goes away.
+
+        Waits on the driver process and on the browser's DevTools websocket
+        (closed by the OS when the browser dies), so nothing runs while the
+        browser is healthy. Without a DevTools endpoint it falls back to
+        polling ``is_alive`` every ``poll_interval`` seconds. ``stop()`` does
+        not trigger the callback.
+        """
+        driver = self.driver
+        if driver is None:
+            return False
+        exited = self._exited = threading.Event()
+
+        def _fire(reason):
+            if exited.is_set() or self.driver is not driver:
+                return
+            exited.set()
+            print(Fore.YELLOW + f"[Browser] {reason}")
+            try:
+                on_exit(self)
+            except Exception as exc:
+                print(Fore.RED + f"[Browser] exit callback failed: {exc}")
+
+        def _wait_driver(proc):
+            proc.wait()
+            _fire("driver process exited")
+
+        def _wait_browser():
+            url = _devtools_url(driver)
+            if url and _wait_devtools_close(url):
+                _fire("browser closed")
+                return
+            while not exited.is_set() and self.driver is driver:
+                time.sleep(poll_interval)
+                if self.driver is driver and not self.is_alive():
+                    _fire("browser stopped responding")
+                    return
+
+        proc = getattr(getattr(driver, "service", None), "process", None)
+        if proc is not None and hasattr(proc, "wait"):
+            threading.Thread(target=_wait_driver, args=(proc,), name="runyx-driver-watch", daemon=True).start()
+        threading.Thread(target=_wait_browser, name="runyx-browser-watch", daemon=True).start()
+        return True
+
     def is_alive(self):
         """Return True when the browser session still responds."""
         if not self.driver:
             return False
+        if self._exited is not None and self._exited.is_set():
+            return False
         try:
             _ = self.driver.current_window_handle
             return True
         except Exception:
             return False
 
+    def _preferences_path(self):
+        return os.path.join(
+            os.path.abspath(self.user_data_dir),
+            self.profile_dir or "Default",
+            "Secure Preferences",
+        )
+
     def extension_loaded(self):
-        """Return True when the extension is present in the profile."""
-        return self.get_extension_id() is not None
+        """
+        Return True when the extension is registered in the profile.
+
+        Reads Secure Preferences once; returns None while the browser has
+        not written it yet.
+        """
+        if not self.user_data_dir or not self.extension_path:
+            return None
+        if self.use_profile_extensions:
+            return self._scan_preferences(attempts=1) is not None
+        pref_path = self._preferences_path()
+        if not os.path.exists(pref_path):
+            return None
+        try:
+            with open(pref_path, "r", encoding="utf-8") as f:
+                settings = json.load(f).get("extensions", {}).get("settings", {})
+        except Exception:
+            return None
+        return self.get_extension_id() in settings
 
     def get_extension_id(self):
-        """Resolve the extension ID from the profile Secure Preferences."""
+        """
+        Return the extension ID.
+
+        Computed from the unpacked folder when it is loaded with
+        ``--load-extension``; profile extensions are looked up in Secure
+        Preferences instead.
+        """
+        if not self.extension_path:
+            return None
+        if not self.use_profile_extensions:
+            return extension_id_for(os.path.abspath(self.extension_path))
+        return self._scan_preferences()
+
+    def _scan_preferences(self, attempts=20):
+        """Find the extension by path in the profile's Secure Preferences."""
         if not self.user_data_dir or not self.extension_path:
             return None
-        pref_path = os.path.join(
-            os.path.abspath(self.user_data_dir),
-            "Default",
-            "Secure Preferences",
-        )
+        pref_path = self._preferences_path()
         ext_path = os.path.abspath(self.extension_path)
-        for _ in range(20):
+        for _ in range(attempts):
             if os.path.exists(pref_path):
                 try:
                     with open(pref_path, "r", encoding="utf-8") as f:
@@ -0,0 +1,169 @@
+"""Pool of pre-launched browser sessions with checkout/return semantics."""
+
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from colorama import Fore, init
+
+init(autoreset=True)
+
+
+class BrowserPool:
+    """
+    Keep ``size`` browsers launched and ready to hand out.
+
+    ``session_factory(slot)`` returns a new, not yet started
+    ``BrowserSession`` for a slot (each slot needs its own user data dir).
+    ``prepare(session, driver)`` runs after launch, e.g. to import the
+    project and activate the extension. Sessions with a ``watch`` method
+    (``BrowserSession``) report their own exit and are relaunched right
+    away; other idle sessions are probed every ``check_interval`` seconds.
+    Browsers returned dead are relaunched too.
+    """
+    def __init__(self, session_factory, size=2, prepare=None, check_interval=2.0):
+        self.session_factory = session_factory
+        self.size = max(1, int(size))
+        self.prepare = prepare
+        self.check_interval = check_interval
+        self.sessions = {}
+        self._slots = {}
+        self._watched = set()
+        self._idle = deque()
+        self._in_use = set()
+        self._cond = threading.Condition()
+        self._stopping = threading.Event()
+        self._monitor = None
+
+    def start(self, wait=True):
+        """Launch every slot in parallel; optionally wait until all are ready."""
+        self._stopping.clear()
+        threads = [self._spawn(slot) for slot in range(self.size)]
+        if wait:
+            for t in threads:
+                t.join()
+        self._monitor = threading.Thread(target=self._watch, name="runyx-browser-pool", daemon=True)
+        self._monitor.start()
+        return self
+
+    def _spawn(self, slot):
+        t = threading.Thread(target=self._launch, args=(slot,), name=f"runyx-browser-{slot}", daemon=True)
+        t.start()
+        return t
+
+    def _launch(self, slot):
+        """Start (or restart) a slot's browser and mark it idle."""
+        with self._cond:
+            old = self.sessions.pop(slot, None)
+        if old is not None:
+            old.stop()
+        while not self._stopping.is_set():
+            session = self.session_factory(slot)
+            try:
+                driver = session.start()
+                if self.prepare is not None:
+                    self.prepare(session, driver)
+            except Exception as exc:
+                print(Fore.RED + f"[BrowserPool] slot {slot} failed to start: {exc}")
+                session.stop()
+                self._stopping.wait(self.check_interval)
+                continue
+            with self._cond:
+                if not self._stopping.is_set():
+                    self.sessions[slot] = session
+                    self._slots[session] = slot
+                    self._idle.append(session)
+                    self._cond.notify()
+                    print(Fore.GREEN + f"[BrowserPool] slot {slot} ready")
+                    watch = getattr(session, "watch", None)
+                    if watch is not None and watch(self._discard):
+                        self._watched.add(session)
+                    return
+            session.stop()
+            return
+
+    def checkout(self, timeout=None):
+        """Take an idle, live browser; block up to ``timeout`` seconds."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._cond:
+                while not self._idle:
+                    if self._stopping.is_set():
+                        raise RuntimeError("[BrowserPool] pool is stopped")
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("[BrowserPool] no browser available")
+                    self._cond.wait(remaining)
+                session = self._idle.popleft()
+                self._in_use.add(session)
+            if session.is_alive():
+                return session
+            self._discard(session)
+
+    def release(self, session):
+        """Return a checked-out browser; dead ones are relaunched."""
+        with self._cond:
+            self._in_use.discard(session)
+        if self._stopping.is_set():
+            return
+        if not session.is_alive():
+            self._discard(session)
+            return
+        with self._cond:
+            self._idle.append(session)
+            self._cond.notify()
+
+    @contextmanager
+    def session(self, timeout=None):
+        """``with pool.session() as browser:`` checkout/return helper."""
+        browser = self.checkout(timeout)
+        try:
+            yield browser
+        finally:
+            self.release(browser)
+
+    def _discard(self, session, only_idle=False):
+        """Relaunch the slot of a dead session in the background.
+
+        With ``only_idle`` a session that was checked out meanwhile is kept.
+        """
+        with self._cond:
+            if only_idle and session not in self._idle:
+                return
+            self._in_use.discard(session)
+            if session in self._idle:
+                self._idle.remove(session)
+            slot = self._slots.pop(session, None)
+            self._watched.discard(session)
+        if slot is None or self._stopping.is_set():
+            return
+        print(Fore.YELLOW + f"[BrowserPool] slot {slot} died; relaunching...")
+        self._spawn(slot)
+
+    def _watch(self):
+        while not self._stopping.wait(self.check_interval):
+            with self._cond:
+                idle = [s for s in self._idle if s not in self._watched]
+            for session in idle:
+                # probed in place, so checkout still sees it; a checkout during
+                # the probe wins and checks the browser itself
+                if not session.is_alive():
+                    self._discard(session, only_idle=True)
+
+    def stats(self):
+        with self._cond:
+            return {"size": self.size, "idle": len(self._idle), "in_use": len(self._in_use)}
+
+    def stop(self):
+        """Stop the monitor and quit every browser."""
+        self._stopping.set()
+        with self._cond:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+            self._slots.clear()
+            self._watched.clear()
+            self._idle.clear()
+            self._in_use.clear()
+            self._cond.notify_all()
+        for session in sessions:
+            session.stop()
@@ -0,0 +1,116 @@
+"""Pluggable body codecs: fast JSON when available, optional MessagePack/CBOR."""
+
+import json
+import uuid
+import decimal
+import datetime
+import dataclasses
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON = "application/json"
+
+# media type -> (loads, dumps); JSON stays first so "*/*" negotiates to it
+_CODECS = {}
+
+
+# sorted keys and RFC 822 dates, like Flask's default JSON provider; builtin
+# subclasses go through _json_default so lazy mappings (RequestMeta) resolve
+_ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS
+    | orjson.OPT_SORT_KEYS
+    | orjson.OPT_PASSTHROUGH_DATETIME
+    | orjson.OPT_PASSTHROUGH_SUBCLASS
+    if orjson is not None else 0
+)
+
+
+def _json_default(obj):
+    """Serialize the extra types Flask's JSON provider accepts, the way it does."""
+    if isinstance(obj, datetime.date):
+        return http_date(obj)
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, "__html__"):
+        return str(obj.__html__())
+    # subclasses orjson passes through; the stdlib encodes them natively
+    if isinstance(obj, dict):
+        return dict(obj.items())
+    if isinstance(obj, list):
+        return list(obj)
+    if isinstance(obj, str):
+        return str.__str__(obj)
+    if isinstance(obj, int):
+        return int.__int__(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def json_dumps(obj):
+    """Encode ``obj`` as compact JSON bytes, using orjson when installed."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=_json_default, option=_ORJSON_OPTIONS)
+        except TypeError:
+            # e.g. integers wider than 64 bits; the stdlib handles those
+            pass
+    return json.dumps(obj, separators=(",", ":"), sort_keys=True, default=_json_default).encode("utf-8")
+
+
+def json_loads(data):
+    """Decode JSON bytes/str, using orjson when installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def register_codec(media_type, loads, dumps):
+    """Register ``loads(bytes)`` / ``dumps(obj) -> bytes`` for a media type."""
+    _CODECS[media_type] = (loads, dumps)
+
+
+def get_codec(media_type):
+    """Return ``(loads, dumps)`` for a media type, or None."""
+    if media_type and media_type.endswith("+json"):
+        media_type = JSON
+    return _CODECS.get(media_type)
+
+
+def negotiate(accept):
+    """Pick ``(media_type, dumps)`` for a werkzeug ``MIMEAccept`` header."""
+    media_type = accept.best_match(list(_CODECS), default=JSON) if accept else JSON
+    return media_type, _CODECS[media_type][1]
+
+
+def _register_defaults():
+    """Register JSON plus MessagePack/CBOR when their libraries are installed."""
+    register_codec(JSON, json_loads, json_dumps)
+
+    try:
+        import msgpack
+    except ImportError:
+        pass
+    else:
+        def msgpack_loads(data):
+            return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+        def msgpack_dumps(obj):
+            return msgpack.packb(obj, use_bin_type=True, default=_json_default)
+
+        register_codec("application/msgpack", msgpack_loads, msgpack_dumps)
+        register_codec("application/x-msgpack", msgpack_loads, msgpack_dumps)
+
+    try:
+        import cbor2
+    except ImportError:
+        pass
+    else:
+        register_codec("application/cbor", cbor2.loads, cbor2.dumps)
+
+
+_register_defaults()
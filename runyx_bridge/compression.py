@@ -0,0 +1,199 @@
+"""Content-Encoding support: decode compressed request bodies, compress responses."""
+
+import io
+import zlib
+from werkzeug.exceptions import BadRequest, HTTPException, RequestEntityTooLarge, UnsupportedMediaType
+from werkzeug.wsgi import LimitedStream
+
+_CHUNK_SIZE = 64 * 1024
+
+# responses smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = 1024
+
+# decoded request bodies larger than this are rejected with 413
+MAX_DECODED_SIZE = 64 * 1024 * 1024
+
+# encoding -> factory(raw) returning a raw stream of the decoded body
+_DECODERS = {}
+# encoding -> compress(data); insertion order is the server preference
+_ENCODERS = {}
+
+
+class _ZlibDecoder:
+    """gzip/deflate with bounded output: input past ``max_length`` waits in the tail."""
+    def __init__(self, wbits):
+        self._obj = zlib.decompressobj(wbits)
+        self.needs_input = True
+
+    def decompress(self, data, max_length):
+        out = self._obj.decompress(self._obj.unconsumed_tail + data, max_length)
+        self.needs_input = not self._obj.unconsumed_tail and len(out) < max_length
+        return out
+
+    def flush(self):
+        return self._obj.flush()
+
+
+class DecodingReader(io.RawIOBase):
+    """
+    Readable stream that decompresses ``raw`` chunk by chunk as it is read.
+
+    Each step decodes at most ``_CHUNK_SIZE`` bytes, however well the body
+    compresses, and more than ``MAX_DECODED_SIZE`` decoded bytes in total
+    raise 413. ``decoder`` has ``decompress(data, max_length)``,
+    ``needs_input`` and ``flush()``.
+    """
+    def __init__(self, raw, decoder=None):
+        self._raw = raw
+        self._decoder = decoder
+        self._buf = b""
+        self._pos = 0
+        self._total = 0
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def _decode(self):
+        """Return the next piece of decoded output (b"" at the end)."""
+        if not self._decoder.needs_input:
+            return self._decoder.decompress(b"", _CHUNK_SIZE)
+        chunk = self._raw.read(_CHUNK_SIZE)
+        if chunk:
+            return self._decoder.decompress(chunk, _CHUNK_SIZE)
+        self._eof = True
+        return self._decoder.flush()
+
+    def readinto(self, b):
+        while self._pos >= len(self._buf):
+            if self._eof:
+                return 0
+            try:
+                self._buf, self._pos = self._decode(), 0
+            except HTTPException:
+                # e.g. 413 from an inner coding, or a client disconnect
+                raise
+            except Exception as exc:
+                raise BadRequest(f"invalid compressed body: {exc}") from exc
+            self._total += len(self._buf)
+            if self._total > MAX_DECODED_SIZE:
+                raise RequestEntityTooLarge(f"decoded body exceeds {MAX_DECODED_SIZE} bytes")
+        n = min(len(b), len(self._buf) - self._pos)
+        b[:n] = memoryview(self._buf)[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+
+def _encodings(header):
+    """Split a Content-Encoding header into its (applied-in-order) codings."""
+    codings = [c.strip().lower() for c in header.split(",")]
+    return [c for c in codings if c and c != "identity"]
+
+
+def decode_environ(environ):
+    """
+    Make ``wsgi.input`` yield the decoded body of a compressed request.
+
+    The input stream is wrapped, not read, so the body is decompressed while
+    the route reads it. Content-Length no longer applies and is dropped.
+    Returns True when the body was encoded.
+    """
+    codings = _encodings(environ.get("HTTP_CONTENT_ENCODING", ""))
+    if not codings:
+        return False
+    unknown = [c for c in codings if c not in _DECODERS]
+    if unknown:
+        raise UnsupportedMediaType(f"unsupported Content-Encoding: {', '.join(unknown)}")
+
+    stream = environ["wsgi.input"]
+    length = environ.get("CONTENT_LENGTH")
+    if length and not environ.get("wsgi.input_terminated"):
+        stream = LimitedStream(stream, int(length))
+    # codings are listed in the order they were applied
+    for coding in reversed(codings):
+        stream = io.BufferedReader(_DECODERS[coding](stream), _CHUNK_SIZE)
+
+    environ["wsgi.input"] = stream
+    environ["wsgi.input_terminated"] = True
+    environ.pop("CONTENT_LENGTH", None)
+    environ.pop("HTTP_CONTENT_ENCODING", None)
+    return True
+
+
+def compress_response(response, req):
+    """Compress a response body with the best encoding the client accepts."""
+    if response.direct_passthrough or "Content-Encoding" in response.headers:
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    coding = req.accept_encodings.best_match(list(_ENCODERS))
+    if coding is None:
+        return response
+    response.set_data(_ENCODERS[coding](data))
+    response.headers["Content-Encoding"] = coding
+    return response
+
+
+def _register_defaults():
+    """Register gzip/deflate plus Brotli/Zstandard when their libraries are installed."""
+    _DECODERS["gzip"] = _DECODERS["x-gzip"] = lambda raw: DecodingReader(raw, _ZlibDecoder(16 + zlib.MAX_WBITS))
+    _DECODERS["deflate"] = lambda raw: DecodingReader(raw, _ZlibDecoder(zlib.MAX_WBITS))
+
+    try:
+        import zstandard
+    except ImportError:
+        zstandard = None
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    if zstandard is not None:
+        class _ZstdReader(DecodingReader):
+            # zstd's decompressobj cannot bound its output; its stream reader can
+            def __init__(self, raw):
+                super().__init__(raw)
+                self._reader = zstandard.ZstdDecompressor().stream_reader(
+                    raw, read_size=_CHUNK_SIZE, read_across_frames=True
+                )
+
+            def _decode(self):
+                data = self._reader.read(_CHUNK_SIZE)
+                self._eof = not data
+                return data
+
+        _DECODERS["zstd"] = _ZstdReader
+        # compressor objects are not thread-safe, so build one per response
+        _ENCODERS["zstd"] = lambda data: zstandard.ZstdCompressor(level=3).compress(data)
+
+    if brotli is not None:
+        class _BrotliDecoder:
+            def __init__(self):
+                self._obj = brotli.Decompressor()
+                self.needs_input = True
+
+            def decompress(self, data, max_length):
+                out = self._obj.process(data, output_buffer_limit=max_length)
+                # a full buffer means more output may be pending
+                self.needs_input = len(out) < max_length
+                return out
+
+            def flush(self):
+                return b""
+
+        _DECODERS["br"] = lambda raw: DecodingReader(raw, _BrotliDecoder())
+        _ENCODERS["br"] = lambda data: brotli.compress(data, quality=4)
+
+    _ENCODERS["gzip"] = _gzip
+
+
+def _gzip(data):
+    """Gzip ``data`` in one shot."""
+    obj = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return obj.compress(data) + obj.flush()
+
+
+_register_defaults()
@@ -1,26 +1,343 @@
 """HTTP routing helpers for the lightweight Flask server."""
 
-from flask import request, jsonify
+import os
+import asyncio
+import inspect
+import functools
+import tempfile
+import threading
+from flask import request
+from werkzeug.wrappers import Response
+from . import codec, profiling
+from .compression import compress_response, decode_environ
+from .handler_pool import HandlerPool
 
 _ROUTES = []
 
+# bodies larger than this are spooled to a temp file for stream=True routes
+SPOOL_THRESHOLD = 1024 * 1024
+_CHUNK_SIZE = 64 * 1024
 
-def receive(path, methods=None):
-    """Register a handler for a given path and HTTP methods."""
+_LOOP = None
+_LOOP_LOCK = threading.Lock()
+
+
+def receive(
+    path,
+    methods=None,
+    stream=False,
+    spool_threshold=None,
+    raw=False,
+    workers=None,
+    queue_size=64,
+    executor="thread",
+    queue_timeout=None,
+    retry_after=1,
+):
+    """Register a handler for a given path and HTTP methods.
+
+    The handler may be a plain function or an ``async def`` coroutine.
+
+    With ``stream=True`` the handler receives a binary file object over the
+    request body instead of decoded JSON/bytes. Bodies up to
+    ``spool_threshold`` bytes (default ``SPOOL_THRESHOLD``) stay in memory,
+    larger ones are spooled to a temporary file. The file is closed once the
+    handler returns.
+
+    With ``raw=True`` the payload is always the body bytes, whatever the
+    content type, so decoding can be left to the handler.
+
+    By default handlers run in the request's own thread. With ``workers=N``
+    a plain handler runs on a per-route pool of ``N`` threads (or spawned
+    processes with ``executor="process"``, ``os.cpu_count()`` by default;
+    the handler must then be a module-level function and meta is passed as
+    a plain dict). Pooled handlers get everything through ``payload`` and
+    ``meta``; ``flask.request`` is not available on pool threads. At most
+    ``queue_size`` further requests wait for a worker; beyond that the
+    route answers 429 with ``Retry-After: retry_after``. Requests that
+    waited more than ``queue_timeout`` seconds get 503 instead. Coroutine
+    handlers are never pooled.
+    """
     if methods is None:
         methods = ["POST", "PUT", "OPTIONS"]
+    if stream and executor == "process":
+        raise ValueError("[HTTP] stream=True routes cannot use executor='process'")
+    pooled = workers is not None or executor != "thread"
 
     def decorator(func):
+        if pooled and inspect.iscoroutinefunction(func):
+            raise ValueError(f"[HTTP] {path}: coroutine handlers cannot use workers/executor")
+        pool = None
+        if pooled:
+            pool = HandlerPool(
+                path,
+                workers=workers if workers is not None else os.cpu_count() or 1,
+                queue_size=queue_size,
+                executor=executor,
+                queue_timeout=queue_timeout,
+                retry_after=retry_after,
+            )
         _ROUTES.append({
             "path": path,
             "methods": methods,
             "handler": func,
+            "stream": stream,
+            "spool_threshold": spool_threshold,
+            "raw": raw,
+            "pool": pool,
         })
         return func
 
     return decorator
 
 
+def _get_loop():
+    """Return the background event loop shared by async handlers."""
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            loop = asyncio.new_event_loop()
+            t = threading.Thread(
+                target=loop.run_forever,
+                name="runyx-async-handlers",
+                daemon=True,
+            )
+            t.start()
+            _LOOP = loop
+    return _LOOP
+
+
+async def _await(awaitable):
+    """Wrap any awaitable so it can be scheduled as a coroutine."""
+    return await awaitable
+
+
+def _spool_threshold(route):
+    """Return the in-memory size limit for a route's spooled body."""
+    threshold = route.get("spool_threshold")
+    return SPOOL_THRESHOLD if threshold is None else threshold
+
+
+def _spool(chunks, threshold):
+    """Write body chunks to a file that spills to disk past threshold."""
+    spool = tempfile.SpooledTemporaryFile(max_size=threshold)
+    try:
+        for chunk in chunks:
+            spool.write(chunk)
+        spool.seek(0)
+    except BaseException:
+        # e.g. a corrupt compressed body: the handler never gets the spool
+        spool.close()
+        raise
+    return spool
+
+
+def _iter_stream(stream):
+    """Yield a file-like stream in fixed-size chunks."""
+    while True:
+        chunk = stream.read(_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _read_payload(req, raw=False):
+    """Decode the body with the codec for its content type, else raw bytes.
+
+    A body that fails to decode gives None, like Flask's silent get_json.
+    """
+    # read outside the try: body errors (413, disconnects) must propagate
+    data = req.get_data()
+    if raw:
+        return data
+    entry = codec.get_codec(req.mimetype)
+    if entry is None:
+        return data
+    try:
+        return entry[0](data)
+    except Exception:
+        return None
+
+
+def _make_response(result, req):
+    """Encode ``{"ok": True, "result": ...}`` with the negotiated codec.
+
+    Large bodies are compressed when the client sends Accept-Encoding.
+    """
+    media_type, dumps = codec.negotiate(req.accept_mimetypes)
+    response = Response(dumps({"ok": True, "result": result}), mimetype=media_type)
+    return compress_response(response, req)
+
+
+_MISSING = object()
+
+_META_RESOLVERS = {
+    "headers": lambda req: dict(req.headers),
+    "method": lambda req: req.method,
+    "path": lambda req: req.path,
+    "remote_addr": lambda req: req.remote_addr,
+    "content_type": lambda req: req.headers.get("Content-Type"),
+    "query": lambda req: req.args.to_dict(),
+}
+
+
+class RequestMeta(dict):
+    """
+    Request metadata passed to handlers, resolved lazily on first access.
+
+    A real ``dict`` (``meta["method"]``, ``meta.get("headers")``,
+    ``dict(meta)``, ``json.dumps(meta)``) that only computes a key when it
+    is read (``method`` and ``path`` are set up front; encoders skip the
+    ``items()`` call for an empty dict). Keys: headers, method, path,
+    remote_addr, content_type, query. ``meta["body"]`` is a memoryview over the already-read request bytes
+    (None for ``stream=True`` routes); it is not listed among the keys, so
+    the mapping stays JSON-serializable.
+    """
+    __slots__ = ("_req", "_body", "_deleted")
+
+    def __init__(self, req, stream=False):
+        super().__init__(method=req.method, path=req.path)
+        self._req = req
+        self._body = None if stream else _MISSING
+        self._deleted = set()
+
+    def __missing__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if key == "body":
+            if self._body is _MISSING:
+                self._body = memoryview(self._req.get_data())
+            return self._body
+        value = _META_RESOLVERS[key](self._req)
+        dict.__setitem__(self, key, value)
+        return value
+
+    def _resolve_all(self):
+        """Compute every lazy key not read yet (before whole-mapping access)."""
+        for key in _META_RESOLVERS:
+            if key not in self._deleted and not dict.__contains__(self, key):
+                self[key]
+
+    def __setitem__(self, key, value):
+        self._deleted.discard(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        dict.pop(self, key, None)
+        # remember deletions of lazy keys so they are not resolved again
+        self._deleted.add(key)
+
+    def __contains__(self, key):
+        if dict.__contains__(self, key):
+            return True
+        return (key == "body" or key in _META_RESOLVERS) and key not in self._deleted
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def pop(self, key, *default):
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        if default:
+            return default[0]
+        raise KeyError(key)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def __iter__(self):
+        self._resolve_all()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self._resolve_all()
+        return dict.__len__(self)
+
+    def keys(self):
+        self._resolve_all()
+        return dict.keys(self)
+
+    def values(self):
+        self._resolve_all()
+        return dict.values(self)
+
+    def items(self):
+        self._resolve_all()
+        return dict.items(self)
+
+    def copy(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        return dict(self.items()) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"RequestMeta({dict(self.items())!r})"
+
+    def __reduce__(self):
+        return dict, (dict(self.items()),)
+
+
+def _build_meta(req, stream=False):
+    """Wrap the request in a lazily resolved RequestMeta."""
+    get_current = getattr(req, "_get_current_object", None)
+    if get_current is not None:
+        # unwrap Flask's context-local proxy so async handlers can use it
+        req = get_current()
+    return RequestMeta(req, stream=stream)
+
+
+def _call_handler(fn, payload, meta):
+    """Call a handler from a sync view, running coroutines on the shared loop."""
+    result = fn(payload, meta)
+    if inspect.isawaitable(result):
+        future = asyncio.run_coroutine_threadsafe(_await(result), _get_loop())
+        result = future.result()
+    return result
+
+
+def _plain_meta(meta):
+    """Materialize meta into a picklable dict (body as bytes) for process workers."""
+    plain = {k: bytes(v) if isinstance(v, memoryview) else v for k, v in meta.items()}
+    body = meta["body"]
+    plain["body"] = bytes(body) if body is not None else None
+    return plain
+
+
+def _submit(route, fn, payload, meta):
+    """Queue the handler on the route's pool; return a future of its outcome."""
+    pool = route["pool"]
+    call = functools.partial(_call_handler, fn)
+    if pool.executor == "process":
+        meta = _plain_meta(meta)
+    else:
+        # payload and meta are built here; the worker gets no request context
+        call = profiling.wrap(route["path"], call)
+    return pool.submit(call, payload, meta)
+
+
+def _run_handler(route, fn, payload, meta):
+    """Run a handler in the calling thread, or on the route's pool when it has one."""
+    pool = route["pool"]
+    if pool is not None:
+        return pool.result(_submit(route, fn, payload, meta).result())
+    if inspect.iscoroutinefunction(fn):
+        # profile the coroutine on the shared loop, where it actually runs
+        return _call_handler(profiling.wrap_async(route["path"], fn), payload, meta)
+    return profiling.wrap(route["path"], functools.partial(_call_handler, fn))(payload, meta)
+
+
 def register_routes(app):
     """Attach all registered handlers to the Flask app."""
     for route in _ROUTES:
@@ -28,27 +345,31 @@ def register_routes(app):
         methods = route["methods"]
         handler = route["handler"]
 
-        def make_view(fn):
+        def make_view(fn, route):
             def view():
                 if request.method == "OPTIONS":
                     return ("", 204)
 
+                pool = route["pool"]
+                if pool is not None:
+                    # reject before reading the body when the route is saturated
+                    pool.acquire()
                 payload = None
-                if request.is_json:
-                    payload = request.get_json(silent=True)
-                else:
-                    payload = request.get_data()
-
-                meta = {
-                    "headers": dict(request.headers),
-                    "method": request.method,
-                    "path": request.path,
-                    "remote_addr": request.remote_addr,
-                    "content_type": request.headers.get("Content-Type"),
-                }
-
-                result = fn(payload, meta)
-                return jsonify({"ok": True, "result": result})
+                try:
+                    # gzip/deflate/br/zstd bodies are decoded as they are read
+                    decode_environ(request.environ)
+                    if route.get("stream"):
+                        payload = _spool(_iter_stream(request.stream), _spool_threshold(route))
+                    else:
+                        payload = _read_payload(request, raw=route.get("raw"))
+                    meta = _build_meta(request, stream=route.get("stream"))
+                    result = _run_handler(route, fn, payload, meta)
+                finally:
+                    if pool is not None:
+                        pool.release()
+                    if route.get("stream") and payload is not None:
+                        payload.close()
+                return _make_response(result, request)
 
             return view
 
@@ -59,6 +380,6 @@ def register_routes(app):
         app.add_url_rule(
             path,
             endpoint=endpoint_name,
-            view_func=make_view(handler),
+            view_func=make_view(handler, route),
             methods=methods,
         )
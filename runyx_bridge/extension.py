@@ -4,6 +4,33 @@ import time
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.keys import Keys
 
+PROJECTS_KEY = "runyx:projects"
+
+_SELECTED_PROJECT_JS = """
+const key = arguments[0];
+const done = arguments[arguments.length - 1];
+if (!(window.chrome && chrome.storage && chrome.storage.local)) { done(null); return; }
+chrome.storage.local.get([key], (data) => {
+  const projects = data && data[key];
+  done(projects ? projects.selectedProjectId || null : null);
+});
+"""
+
+
+def wait_until(check, timeout, interval=0.05):
+    """Poll ``check()`` until it is truthy; return seconds waited, or None on timeout."""
+    started = time.perf_counter()
+    deadline = started + timeout
+    while True:
+        try:
+            if check():
+                return time.perf_counter() - started
+        except Exception:
+            pass
+        if time.perf_counter() >= deadline:
+            return None
+        time.sleep(interval)
+
 
 class ExtensionActivator:
     """Send the activation hotkey and optionally open the UI directly."""
@@ -37,3 +64,31 @@ class ExtensionActivator:
             except Exception:
                 continue
         return False
+
+    def wait_for_service_worker(self, driver, extension_id, timeout=10):
+        """Wait until the extension's service worker target is running (CDP)."""
+        prefix = f"://{extension_id}/"
+
+        def _registered():
+            targets = driver.execute_cdp_cmd("Target.getTargets", {}).get("targetInfos", [])
+            return any(t.get("type") == "service_worker" and prefix in t.get("url", "") for t in targets)
+
+        if not hasattr(driver, "execute_cdp_cmd"):
+            return None
+        return wait_until(_registered, timeout)
+
+    def wait_for_ui(self, driver, timeout=10):
+        """Wait until the current page (``ui.html``) finished loading."""
+        return wait_until(
+            lambda: driver.execute_script("return document.readyState") == "complete"
+            and "/ui.html" in driver.current_url,
+            timeout,
+        )
+
+    def wait_for_project(self, driver, project_id, timeout=10):
+        """Wait until the extension storage holds ``project_id`` as selected project."""
+        return wait_until(
+            lambda: driver.execute_async_script(_SELECTED_PROJECT_JS, PROJECTS_KEY) == project_id,
+            timeout,
+            interval=0.1,
+        )
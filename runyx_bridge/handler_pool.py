@@ -0,0 +1,131 @@
+"""Bounded per-route handler pools with admission control."""
+
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+from . import metrics
+
+EXECUTORS = ("thread", "process")
+
+# handler pools by route path, for queue_stats()
+_POOLS = {}
+
+
+def _run_timed(fn, payload, meta, admitted_at, queue_timeout):
+    """Run ``fn`` unless it waited in the queue longer than ``queue_timeout``."""
+    if queue_timeout is not None and time.time() - admitted_at > queue_timeout:
+        return False, None
+    return True, fn(payload, meta)
+
+
+class HandlerPool:
+    """
+    Run a route's handler on ``workers`` threads or processes.
+
+    At most ``workers + queue_size`` requests are admitted at once; further
+    requests are rejected with 429 and ``Retry-After`` before their body is
+    read. A request that waited longer than ``queue_timeout`` seconds for a
+    worker is answered with 503 instead of running the handler.
+    """
+    def __init__(self, path, workers=8, queue_size=64, executor="thread",
+                 queue_timeout=None, retry_after=1):
+        if executor not in EXECUTORS:
+            raise ValueError(f"[HTTP] executor must be one of {EXECUTORS}, got {executor!r}")
+        self.path = path
+        self.workers = max(1, int(workers))
+        self.queue_size = max(0, int(queue_size))
+        self.executor = executor
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.rejected = 0
+        self.expired = 0
+        self._pool = None
+        self._lock = threading.Lock()
+        _POOLS[path] = self
+
+    def _get_pool(self):
+        """Create the executor on first use (i.e. inside the server process)."""
+        with self._lock:
+            if self._pool is None:
+                if self.executor == "process":
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                else:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.workers,
+                        thread_name_prefix=f"runyx-handler{self.path.replace('/', '-')}",
+                    )
+            return self._pool
+
+    def acquire(self):
+        """Admit one request or raise 429 when the route's queue is full."""
+        with self._lock:
+            if self.in_flight >= self.workers + self.queue_size:
+                self.rejected += 1
+                raise TooManyRequests(
+                    f"{self.path} is at capacity ({self.queue_size} queued)",
+                    retry_after=self.retry_after,
+                )
+            self.in_flight += 1
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def submit(self, fn, payload, meta):
+        """Queue an admitted request; return a future of the handler result."""
+        return self._get_pool().submit(
+            _run_timed, fn, payload, meta, time.time(), self.queue_timeout
+        )
+
+    def result(self, outcome):
+        """Unwrap a ``submit`` outcome, raising 503 for timed-out requests."""
+        started, value = outcome
+        if not started:
+            with self._lock:
+                self.expired += 1
+            raise ServiceUnavailable(
+                f"{self.path} queue wait exceeded {self.queue_timeout}s",
+                retry_after=self.retry_after,
+            )
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "executor": self.executor,
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "in_flight": self.in_flight,
+                "queued": max(0, self.in_flight - self.workers),
+                "rejected": self.rejected,
+                "expired": self.expired,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def queue_stats():
+    """Return per-route queue depth and rejection counters of this process."""
+    return {path: pool.stats() for path, pool in _POOLS.items()}
+
+
+def _pool_gauges():
+    """Report in-flight and queued requests for every route's handler pool."""
+    samples = []
+    for path, stats in queue_stats().items():
+        samples.append(("runyx_http_in_flight", {"route": path}, stats["in_flight"]))
+        samples.append(("runyx_http_queue_depth", {"route": path}, stats["queued"]))
+    return samples
+
+
+metrics.register_gauge(_pool_gauges)
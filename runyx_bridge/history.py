@@ -0,0 +1,325 @@
+"""Indexed local store for workflow run history, split out of project exports."""
+
+import os
+import re
+import sys
+import json
+import math
+import sqlite3
+import argparse
+import threading
+from contextlib import contextmanager
+from . import codec, project_file
+
+_BATCH_SIZE = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    workflow_id TEXT NOT NULL,
+    status TEXT,
+    trigger TEXT,
+    start_time INTEGER NOT NULL DEFAULT 0,
+    end_time INTEGER,
+    duration_ms REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_workflow ON runs(workflow_id, start_time, id);
+CREATE INDEX IF NOT EXISTS runs_status ON runs(status, start_time);
+CREATE INDEX IF NOT EXISTS runs_trigger ON runs(trigger, start_time);
+CREATE INDEX IF NOT EXISTS runs_start ON runs(start_time);
+CREATE INDEX IF NOT EXISTS runs_duration ON runs(duration_ms);
+CREATE INDEX IF NOT EXISTS runs_workflow_duration ON runs(workflow_id, duration_ms);
+"""
+
+_INSERT = "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+
+_DURATION = re.compile(r"^\s*([0-9.]+)\s*(ms|s|m)?\s*$")
+_UNIT_MS = {"ms": 1, "s": 1000, "m": 60000, None: 1000}
+
+
+def _number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def duration_ms(run):
+    """Run duration in ms: ``endTime - startTime``, else the ``"1.5s"`` string."""
+    start, end = _number(run.get("startTime")), _number(run.get("endTime"))
+    if start is not None and end is not None:
+        return end - start
+    match = _DURATION.match(str(run.get("duration") or ""))
+    if match:
+        try:
+            return float(match.group(1)) * _UNIT_MS[match.group(2)]
+        except ValueError:
+            return None
+    return None
+
+
+def _row(run, workflow_id=None):
+    if not isinstance(run, dict) or not isinstance(run.get("id"), str):
+        raise ValueError("[History] each run must be an object with a string id.")
+    workflow_id = run.get("workflowId") or workflow_id
+    if not workflow_id:
+        raise ValueError(f"[History] run {run['id']} has no workflowId.")
+    return (
+        run["id"],
+        str(workflow_id),
+        run.get("status"),
+        run.get("trigger"),
+        _number(run.get("startTime")) or 0,
+        _number(run.get("endTime")),
+        duration_ms(run),
+        codec.json_dumps(run).decode("utf-8"),
+    )
+
+
+class RunHistory:
+    """
+    Run records in a WAL-mode SQLite file, indexed for the usual lookups.
+
+    Each run is stored once by id (re-adding replaces it) as compact JSON,
+    next to the columns it is filtered on: workflow id, status, trigger and
+    start time. ``start_time``/``end_time`` are the export's epoch ms
+    (0 when a run has no start time).
+    """
+    def __init__(self, path="runs.sqlite3"):
+        self.path = os.path.abspath(path)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def add(self, run, workflow_id=None):
+        """Store one run; ``workflow_id`` is used when the run has no ``workflowId``."""
+        return self.add_many([run], workflow_id)
+
+    def add_many(self, runs, workflow_id=None):
+        """Store runs in a single transaction; return how many were written."""
+        return self.insert_rows(self.rows(runs, workflow_id))
+
+    @staticmethod
+    def rows(runs, workflow_id=None):
+        """Validate runs and return their rows for ``insert_rows``; raises ``ValueError``."""
+        return [_row(run, workflow_id) for run in runs]
+
+    def insert_rows(self, rows):
+        """Store rows built by ``rows`` in a single transaction; return how many were written."""
+        if not rows:
+            return 0
+        with self._transaction() as insert:
+            return insert(rows)
+
+    @contextmanager
+    def _transaction(self):
+        """Yield ``insert(rows)`` writing into one transaction, rolled back on error."""
+        def insert(rows):
+            if rows:
+                self._db.executemany(_INSERT, rows)
+            return len(rows)
+
+        with self._lock, self._db:
+            yield insert
+
+    def _where(self, workflow_id=None, status=None, trigger=None, since=None, until=None):
+        clauses, params = [], []
+        for column, value in (("workflow_id", workflow_id), ("status", status), ("trigger", trigger)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("start_time >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("start_time < ?")
+            params.append(until)
+        return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+    def query(self, workflow_id=None, status=None, trigger=None, since=None, until=None, limit=100):
+        """Return matching runs, newest first; ``since``/``until`` are epoch ms."""
+        where, params = self._where(workflow_id, status, trigger, since, until)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT data FROM runs {where} ORDER BY start_time DESC, id DESC LIMIT ?",
+                (*params, -1 if limit is None else limit),
+            ).fetchall()
+        return [codec.json_loads(row[0]) for row in rows]
+
+    def count(self, workflow_id=None, status=None, trigger=None, since=None, until=None):
+        """Return how many runs match the same filters as ``query``."""
+        where, params = self._where(workflow_id, status, trigger, since, until)
+        with self._lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM runs {where}", params).fetchone()[0]
+
+    def duration_stats(self, workflow_id=None, status=None, trigger=None, since=None, until=None):
+        """
+        Summarise matching runs: count, per-status counts and duration percentiles.
+
+        Percentiles are nearest-rank over runs with a known duration (ms),
+        read in one ordered pass (by index when unfiltered or filtered by
+        workflow only).
+        """
+        where, params = self._where(workflow_id, status, trigger, since, until)
+        timed = f"{where} {'AND' if where else 'WHERE'} duration_ms IS NOT NULL"
+        with self._lock:
+            by_status = dict(self._db.execute(
+                f"SELECT COALESCE(status, ''), COUNT(*) FROM runs {where} GROUP BY status", params
+            ).fetchall())
+            n, mean = self._db.execute(f"SELECT COUNT(*), AVG(duration_ms) FROM runs {timed}", params).fetchone()
+            ranks = {pct: max(1, math.ceil(pct / 100 * n)) for pct in (50, 95)}
+            by_rank = {}
+            if n:
+                by_rank = dict(self._db.execute(
+                    "SELECT rank, duration_ms FROM ("
+                    f"SELECT duration_ms, ROW_NUMBER() OVER (ORDER BY duration_ms) AS rank FROM runs {timed}"
+                    ") WHERE rank IN (?, ?)",
+                    (*params, ranks[50], ranks[95]),
+                ).fetchall())
+        percentiles = {pct: by_rank.get(rank) for pct, rank in ranks.items()}
+        return {
+            "count": sum(by_status.values()),
+            "by_status": by_status,
+            "timed": n,
+            "avg_ms": mean,
+            "p50_ms": percentiles[50],
+            "p95_ms": percentiles[95],
+        }
+
+    def iter_runs(self, workflow_id, batch_size=500):
+        """Yield a workflow's runs newest first, ``batch_size`` rows at a time."""
+        last = None
+        while True:
+            # keyset pagination: the lock is only held per batch
+            if last is None:
+                sql, params = "WHERE workflow_id = ?", [workflow_id]
+            else:
+                sql = "WHERE workflow_id = ? AND (start_time, id) < (?, ?)"
+                params = [workflow_id, *last]
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT start_time, id, data FROM runs {sql} "
+                    "ORDER BY start_time DESC, id DESC LIMIT ?",
+                    (*params, batch_size),
+                ).fetchall()
+            for _start, _id, data in rows:
+                yield codec.json_loads(data)
+            if len(rows) < batch_size:
+                return
+            last = rows[-1][:2]
+
+    def stats(self):
+        """Return run counts overall and per workflow."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT workflow_id, COUNT(*) FROM runs GROUP BY workflow_id ORDER BY workflow_id"
+            ).fetchall()
+        per_workflow = dict(rows)
+        return {"runs": sum(per_workflow.values()), "workflows": per_workflow}
+
+    def close(self):
+        """Close the database connection; the history cannot be used afterwards."""
+        with self._lock:
+            self._db.close()
+
+
+def extract(src, dest, history, keep_runs=0):
+    """
+    Move the ``runs`` of a project export into ``history``.
+
+    Writes a slim copy of ``src`` to ``dest`` keeping the newest
+    ``keep_runs`` runs per workflow (0 = none); every run is stored.
+    Runs are written in one transaction while the export is validated: an
+    invalid export stores nothing and leaves ``dest`` untouched, and
+    ``dest`` is only replaced once the runs are committed. ``history`` is
+    locked for other threads meanwhile. Returns the copy summary plus
+    ``stored``.
+    """
+    pending = []
+    stored = 0
+    staged = f"{dest}.extract"
+
+    def _collect(run, workflow_id):
+        nonlocal stored
+        pending.append(_row(run, workflow_id))
+        if len(pending) >= _BATCH_SIZE:
+            stored += insert(pending)
+            pending.clear()
+
+    try:
+        with history._transaction() as insert:
+            summary = project_file.copy_project(src, staged, keep_runs=keep_runs, on_run=_collect)
+            summary["stored"] = stored + insert(pending)
+        os.replace(staged, dest)
+    finally:
+        if os.path.exists(staged):
+            os.remove(staged)
+    return summary
+
+
+def merge(src, dest, history, keep_runs=None):
+    """
+    Write ``src`` to ``dest`` with each workflow's stored runs merged back.
+
+    Runs are merged newest first by ``startTime``; runs already in the file
+    win over stored copies with the same id. ``keep_runs`` caps the merged
+    history per workflow.
+    """
+    return project_file.copy_project(src, dest, keep_runs=keep_runs, merge_runs=history.iter_runs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m runyx_bridge.history",
+        description="Split Runyx run history out of project exports, query it and merge it back.",
+    )
+    parser.add_argument("--db", default="runs.sqlite3", help="history database (default: runs.sqlite3)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("extract", help="store an export's runs and write a slim project file")
+    p.add_argument("src")
+    p.add_argument("dest")
+    p.add_argument("--keep", type=int, default=0, help="newest runs to keep per workflow in dest")
+
+    p = sub.add_parser("merge", help="write a project file with stored runs merged back")
+    p.add_argument("src")
+    p.add_argument("dest")
+    p.add_argument("--limit", type=int, help="max runs per workflow")
+
+    p = sub.add_parser("query", help="print matching runs as JSON lines, newest first")
+    p.add_argument("--workflow")
+    p.add_argument("--status")
+    p.add_argument("--trigger")
+    p.add_argument("--since", type=int, help="start time >= (epoch ms)")
+    p.add_argument("--until", type=int, help="start time < (epoch ms)")
+    p.add_argument("--limit", type=int, default=100)
+
+    sub.add_parser("stats", help="print run counts per workflow")
+
+    args = parser.parse_args(argv)
+    history = RunHistory(args.db)
+    try:
+        if args.command == "extract":
+            result = extract(args.src, args.dest, history, keep_runs=args.keep)
+        elif args.command == "merge":
+            result = merge(args.src, args.dest, history, keep_runs=args.limit)
+        elif args.command == "query":
+            for run in history.query(args.workflow, args.status, args.trigger, args.since, args.until, args.limit):
+                sys.stdout.write(json.dumps(run, ensure_ascii=False) + "\n")
+            return 0
+        else:
+            result = history.stats()
+        print(json.dumps(result, indent=2))
+        return 0
+    except (OSError, ValueError) as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    finally:
+        history.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
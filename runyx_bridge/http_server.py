@@ -1,13 +1,69 @@
 """Embedded Flask HTTP server with open CORS for local development."""
 
+import time
 import socket
 import logging
-from flask import Flask, cli
+from flask import Flask, Response, cli, g, jsonify, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+from werkzeug.wsgi import LimitedStream
 from colorama import Fore, init
+from . import metrics, profiling
 from .decorators import register_routes
 
 init(autoreset=True)
-cli.show_server_banner = lambda *args, **kwargs: None
+cli.show_server_banner = lambda *args, **kwargs: None
+
+# seconds an idle keep-alive connection (or a stalled read) may take
+KEEP_ALIVE_TIMEOUT = 15
+_DRAIN_SIZE = 64 * 1024
+
+
+class _KeepAliveRequestHandler(WSGIRequestHandler):
+    """
+    Speak HTTP/1.1 and keep connections open between requests.
+
+    Werkzeug's handler always answers ``Connection: close`` because it
+    cannot tell where a request body ends. This one hands the app a stream
+    bounded by Content-Length (or the chunked framing) and drains whatever
+    the app left unread, so the next request line starts cleanly.
+    """
+    protocol_version = "HTTP/1.1"
+    timeout = KEEP_ALIVE_TIMEOUT
+
+    def make_environ(self):
+        environ = super().make_environ()
+        if not environ.get("wsgi.input_terminated"):
+            try:
+                length = max(0, int(environ.get("CONTENT_LENGTH") or 0))
+            except ValueError:
+                length = 0
+                self.close_connection = True
+            environ["wsgi.input"] = LimitedStream(self.rfile, length)
+        # werkzeug drains self.rfile after responding: limit that to the body
+        self.rfile = environ["wsgi.input"]
+        return environ
+
+    def run_wsgi(self):
+        connection_rfile = self.rfile
+        try:
+            super().run_wsgi()
+        finally:
+            body, self.rfile = self.rfile, connection_rfile
+        if body is connection_rfile or self.close_connection:
+            return
+        try:
+            while body.read(_DRAIN_SIZE):
+                pass
+        except Exception:
+            self.close_connection = True
+
+    def send_header(self, keyword, value):
+        # drop werkzeug's unconditional "Connection: close" unless the client
+        # asked to close or cannot keep the connection (HTTP/1.0)
+        if keyword.lower() == "connection" and value.lower() == "close":
+            if self.request_version == "HTTP/1.1" and not self.close_connection:
+                return
+        super().send_header(keyword, value)
 
 
 def _get_local_ip():
@@ -22,10 +78,68 @@ def _get_local_ip():
         return "127.0.0.1"
 
 
-def start_http_server(host, port):
-    """Start the Flask server and register @receive routes."""
+def _print_banner(port, workers=1, backend=None):
+    """Print the HTTP connection banner."""
+    real_ip = _get_local_ip()
+
+    print()
+    print(Fore.CYAN + "[HTTP] server running")
+    print(Fore.GREEN + f"[HTTP] Local:    http://localhost:{port}")
+    print(Fore.YELLOW + f"[HTTP] Network:  http://{real_ip}:{port}")
+    print(Fore.MAGENTA + f"[HTTP] Ngrok:    ngrok http {port}")
+    if backend:
+        print(Fore.CYAN + f"[HTTP] Backend:  {backend}")
+    if workers > 1:
+        print(Fore.CYAN + f"[HTTP] Workers:  {workers}")
+    print()
+
+
+def _profile_admin():
+    """Serve ``ADMIN_PATH``: start a profiling session or list written profiles."""
+    status, result = profiling.admin(request.method, request.get_data())
+    return jsonify({"ok": status < 400, "result": result}), status
+
+
+def _instrument(app, metrics_endpoint, profile_endpoint):
+    """Record per-route metrics and optionally serve ``/metrics`` and the profiler."""
+    @app.before_request
+    def start_timer():
+        g.runyx_started = time.perf_counter()
+        g.runyx_size = request.content_length
+
+    @app.after_request
+    def record(response):
+        rule = request.url_rule
+        if rule is not None and request.endpoint.startswith("receive_") and request.method != "OPTIONS":
+            metrics.observe_request(
+                rule.rule,
+                request.method,
+                response.status_code,
+                time.perf_counter() - g.runyx_started,
+                g.runyx_size,
+            )
+        return response
+
+    if metrics_endpoint:
+        app.add_url_rule(
+            "/metrics",
+            endpoint="runyx_metrics",
+            view_func=lambda: Response(metrics.render(), content_type=metrics.CONTENT_TYPE),
+            methods=["GET"],
+        )
+
+    if profile_endpoint:
+        app.add_url_rule(
+            profiling.ADMIN_PATH,
+            endpoint="runyx_profile",
+            view_func=_profile_admin,
+            methods=["GET", "POST"],
+        )
+
+
+def create_app(metrics_endpoint=False, profile_endpoint=False):
+    """Build the Flask app with open CORS and all @receive routes."""
     app = Flask(__name__)
-    cli.show_server_banner = lambda *args, **kwargs: None
     app.logger.setLevel(logging.ERROR)
     app.logger.disabled = True
     logging.getLogger("werkzeug").setLevel(logging.ERROR)
@@ -38,20 +152,70 @@ def start_http_server(host, port):
         response.headers["Access-Control-Allow-Headers"] = "*"
         return response
 
+    _instrument(app, metrics_endpoint, profile_endpoint)
     register_routes(app)
+    return app
+
+
+def create_http_socket(host, port, backlog=1024):
+    """Bind a listening socket that prefork workers can share."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def start_http_server(
+    host,
+    port,
+    sock=None,
+    worker_id=0,
+    workers=1,
+    metrics_dir=None,
+    profile_dir=None,
+):
+    """Start the Flask server and register @receive routes.
+
+    Without ``sock`` this runs Werkzeug's development server. With a shared
+    listening ``sock`` (see ``create_http_socket``) the process becomes one
+    of ``workers`` prefork workers accepting from that socket. With
+    ``metrics_dir`` the server also answers ``GET /metrics``; with
+    ``profile_dir`` it serves the profiling admin endpoint.
+    """
+    metrics.configure(metrics_dir)
+    profiling.configure(profile_dir, http=True)
+    app = create_app(
+        metrics_endpoint=metrics_dir is not None,
+        profile_endpoint=profile_dir is not None,
+    )
+    cli.show_server_banner = lambda *args, **kwargs: None
 
-    real_ip = _get_local_ip()
+    if worker_id == 0:
+        _print_banner(port, workers=workers)
 
-    print()
-    print(Fore.CYAN + "[HTTP] server running")
-    print(Fore.GREEN + f"[HTTP] Local:    http://localhost:{port}")
-    print(Fore.YELLOW + f"[HTTP] Network:  http://{real_ip}:{port}")
-    print(Fore.MAGENTA + f"[HTTP] Ngrok:    ngrok http {port}")
-    print()
+    if sock is None:
+        app.run(
+            host=host,
+            port=port,
+            debug=False,
+            use_reloader=False,
+        )
+        return
 
-    app.run(
-        host=host,
-        port=port,
-        debug=False,
-        use_reloader=False,
+    server = make_server(
+        host,
+        port,
+        app,
+        threaded=True,
+        request_handler=_KeepAliveRequestHandler,
+        fd=sock.fileno(),
     )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
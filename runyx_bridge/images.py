@@ -0,0 +1,218 @@
+"""Screenshot ingestion: acknowledge fast, decode and write off-thread."""
+
+import os
+import re
+import queue
+import uuid
+import base64
+import binascii
+import threading
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from email.policy import default as _email_policy
+from colorama import Fore, init
+from werkzeug.exceptions import TooManyRequests
+from . import codec
+from .decorators import receive
+
+init(autoreset=True)
+
+# JSON fields checked (in order) for a base64 image or data URL
+IMAGE_FIELDS = ("screenshot", "data", "image", "file", "dataUrl")
+FILE_PARTS = ("file", "screenshot")
+
+_SAFE_NAME = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def _ext_from_mime(mime, fallback="png"):
+    """Return a file extension for an ``image/...`` media type."""
+    if mime and "/" in mime:
+        subtype = mime.split("/", 1)[1].split(";", 1)[0].split("+", 1)[0].strip()
+        if subtype:
+            return "jpg" if subtype == "jpeg" else subtype
+    return fallback
+
+
+def _sanitize_filename(name, ext_hint):
+    """Keep only a safe basename; add ``ext_hint`` when there is no extension."""
+    base = _SAFE_NAME.sub("_", os.path.basename(name.replace("\\", "/"))).strip("._")
+    if not base:
+        return None
+    if "." not in base:
+        base = f"{base}.{ext_hint}"
+    return base
+
+
+def _decode_text(value):
+    """Decode a data URL or plain base64 string into ``(bytes, ext)``."""
+    if value.startswith("data:"):
+        header, _, value = value.partition(",")
+        return base64.b64decode(value, validate=True), _ext_from_mime(header[5:].split(";", 1)[0])
+    return base64.b64decode(value, validate=True), "png"
+
+
+def decode_image(body, content_type):
+    """
+    Turn an upload body into ``(bytes, ext, filename_hint)``.
+
+    Accepts multipart form data (part ``file`` or ``screenshot``), JSON with
+    a base64/data-URL field (see ``IMAGE_FIELDS``, optional ``fileName``),
+    a raw data URL or base64 body, or raw image bytes.
+    """
+    content_type = content_type or ""
+    mime = content_type.split(";", 1)[0].strip().lower()
+
+    if mime == "multipart/form-data":
+        head = f"Content-Type: {content_type}\r\n\r\n".encode("latin-1")
+        message = BytesParser(policy=_email_policy).parsebytes(head + bytes(body))
+        parts = list(message.iter_parts())
+        named = [p for p in parts if p.get_param("name", header="content-disposition") in FILE_PARTS]
+        files = named or [p for p in parts if p.get_filename()]
+        if not files:
+            raise ValueError("multipart body has no file part")
+        part = files[0]
+        filename = part.get_filename()
+        ext = filename.rsplit(".", 1)[1] if filename and "." in filename else _ext_from_mime(part.get_content_type())
+        return part.get_payload(decode=True), ext, filename
+
+    if mime == "application/json" or mime.endswith("+json"):
+        data = codec.json_loads(body)
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
+        for key in IMAGE_FIELDS:
+            value = data.get(key)
+            if isinstance(value, str) and value:
+                raw, ext = _decode_text(value)
+                return raw, ext, data.get("fileName")
+        raise ValueError(f"no image field found (tried {', '.join(IMAGE_FIELDS)})")
+
+    head = bytes(body[:16])
+    if head.startswith(b"data:"):
+        raw, ext = _decode_text(bytes(body).decode("ascii"))
+        return raw, ext, None
+    if mime.startswith("image/"):
+        return bytes(body), _ext_from_mime(mime), None
+    try:
+        return base64.b64decode(bytes(body), validate=True), "png", None
+    except (binascii.Error, ValueError):
+        return bytes(body), "bin", None
+
+
+class ImageWriter:
+    """Bounded job queue drained by background decode-and-write threads."""
+    def __init__(self, out_dir, workers=2, queue_size=64, on_saved=None):
+        self.out_dir = os.path.abspath(out_dir)
+        self.workers = max(1, int(workers))
+        self.on_saved = on_saved
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        """Start worker threads on first use (i.e. inside the server process)."""
+        with self._lock:
+            if self._threads:
+                return
+            os.makedirs(self.out_dir, exist_ok=True)
+            for i in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"runyx-image-writer-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, job_id, body, info):
+        """Queue an upload; return False when the queue is full."""
+        self._ensure_started()
+        try:
+            self.queue.put_nowait((job_id, body, info))
+            return True
+        except queue.Full:
+            return False
+
+    def join(self):
+        """Block until every queued upload has been written."""
+        self.queue.join()
+
+    def _run(self):
+        while True:
+            job_id, body, info = self.queue.get()
+            try:
+                path = self.write(job_id, body, info)
+                if self.on_saved is not None:
+                    self.on_saved(path, info)
+            except Exception as exc:
+                print(Fore.RED + f"[HTTP] image {job_id} failed: {exc}")
+            finally:
+                self.queue.task_done()
+
+    def _claim(self, name, job_id):
+        """Create ``name`` in out_dir, or ``<stem>_<job_id>.<ext>`` if taken; return its path."""
+        stem, _, ext = name.rpartition(".")
+        for candidate in (name, f"{stem}_{job_id}.{ext}"):
+            path = os.path.join(self.out_dir, candidate)
+            try:
+                # exclusive create, so two uploads never end up on one path
+                with open(path, "xb"):
+                    return path
+            except FileExistsError:
+                continue
+        raise FileExistsError(f"[HTTP] image name taken: {path}")
+
+    def write(self, job_id, body, info):
+        """Decode one upload and write it atomically; return the file path."""
+        data, ext, hint = decode_image(body, info.get("content_type"))
+        name = _sanitize_filename(hint, ext) if hint else None
+        if name is None:
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+            name = f"screenshot_{stamp}_{job_id}.{ext}"
+        path = self._claim(name, job_id)
+        tmp = f"{path}.{job_id}.part"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            for leftover in (tmp, path):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            raise
+        info["file"] = path
+        info["size"] = len(data)
+        return path
+
+
+def receive_image(path, out_dir="received_images", methods=None, workers=2, queue_size=64):
+    """
+    Register an image upload route that answers before touching the disk.
+
+    The request thread only queues the raw body; decoding (multipart,
+    base64 JSON field, data URL, raw bytes) and the file write happen on a
+    pool of ``workers`` threads behind a queue of ``queue_size`` uploads.
+    The response result is ``{"queued": True, "id": ...}``; when the queue
+    is full the route answers 429 with ``Retry-After``.
+
+    The decorated function is called on the writer thread as
+    ``fn(saved_path, info)`` once the file is written; ``info`` holds id,
+    path, content_type, remote_addr, file and size. A client file name that
+    is already taken gets the upload id appended instead of overwriting.
+    """
+    def decorator(func):
+        writer = ImageWriter(out_dir, workers=workers, queue_size=queue_size, on_saved=func)
+
+        def handler(payload, meta):
+            job_id = uuid.uuid4().hex[:12]
+            info = {
+                "id": job_id,
+                "path": meta["path"],
+                "content_type": meta["content_type"],
+                "remote_addr": meta["remote_addr"],
+            }
+            if not writer.submit(job_id, payload, info):
+                raise TooManyRequests("image queue full", retry_after=1)
+            return {"queued": True, "id": job_id}
+
+        handler.__name__ = func.__name__
+        handler.writer = writer
+        receive(path, methods=methods, raw=True)(handler)
+        return func
+
+    return decorator
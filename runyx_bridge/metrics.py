@@ -0,0 +1,217 @@
+"""Prometheus metrics for the bridge, aggregated across its child processes."""
+
+import os
+import json
+import time
+import bisect
+import threading
+
+# seconds between snapshot writes; snapshots older than STALE_AFTER seconds
+# no longer contribute gauges (their process is gone)
+FLUSH_INTERVAL = 1.0
+STALE_AFTER = 5 * FLUSH_INTERVAL
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# name -> (type, help, buckets)
+METRICS = {
+    "runyx_http_requests_total": ("counter", "HTTP requests by route, method and status.", None),
+    "runyx_http_errors_total": ("counter", "HTTP requests that ended in a 5xx status.", None),
+    "runyx_http_request_duration_seconds": ("histogram", "Time spent serving a request.", LATENCY_BUCKETS),
+    "runyx_http_request_body_bytes": ("histogram", "Request body size as received.", SIZE_BUCKETS),
+    "runyx_http_in_flight": ("gauge", "Requests admitted to a route's handler pool.", None),
+    "runyx_http_queue_depth": ("gauge", "Requests waiting for a handler worker.", None),
+    "runyx_ws_clients": ("gauge", "Connected WebSocket clients.", None),
+    "runyx_ws_subscribers": ("gauge", "WebSocket clients subscribed to a channel.", None),
+    "runyx_ws_messages_in_total": ("counter", "Trigger messages received, by channel.", None),
+    "runyx_ws_messages_out_total": ("counter", "Messages queued to clients, by channel.", None),
+    "runyx_ws_dropped_total": ("counter", "Messages dropped for slow consumers.", None),
+}
+
+_LOCK = threading.Lock()
+_COUNTERS = {}
+_HISTOGRAMS = {}
+_GAUGES = []
+_STATE = {"dir": None, "thread": None}
+
+
+def _key(labels):
+    """Turn a labels dict into a hashable, order-independent key."""
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Add ``value`` to a counter."""
+    key = (name, _key(labels))
+    with _LOCK:
+        _COUNTERS[key] = _COUNTERS.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    """Record one histogram observation."""
+    buckets = METRICS[name][2]
+    key = (name, _key(labels))
+    with _LOCK:
+        entry = _HISTOGRAMS.get(key)
+        if entry is None:
+            entry = _HISTOGRAMS[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+
+def register_gauge(collect):
+    """Register ``collect() -> [(name, labels, value), ...]``, read at snapshot time."""
+    _GAUGES.append(collect)
+
+
+def observe_request(route, method, status, seconds, size):
+    """Record one served @receive request."""
+    inc("runyx_http_requests_total", route=route, method=method, status=str(status))
+    if status >= 500:
+        inc("runyx_http_errors_total", route=route)
+    observe("runyx_http_request_duration_seconds", seconds, route=route)
+    if size is not None:
+        observe("runyx_http_request_body_bytes", size, route=route)
+
+
+def snapshot():
+    """Return this process' metrics as a JSON-serializable dict."""
+    gauges = []
+    for collect in list(_GAUGES):
+        try:
+            gauges.extend(collect())
+        except Exception:
+            pass
+    with _LOCK:
+        counters = [[name, dict(labels), value] for (name, labels), value in _COUNTERS.items()]
+        histograms = [
+            [name, dict(labels), list(entry[0]), entry[1], entry[2]]
+            for (name, labels), entry in _HISTOGRAMS.items()
+        ]
+    return {
+        "pid": os.getpid(),
+        "time": time.time(),
+        "counters": counters,
+        "histograms": histograms,
+        "gauges": [[name, dict(labels), value] for name, labels, value in gauges],
+    }
+
+
+def _write_snapshot():
+    """Atomically replace this process' snapshot file in the metrics dir."""
+    metrics_dir = _STATE["dir"]
+    if not metrics_dir:
+        return
+    path = os.path.join(metrics_dir, f"{os.getpid()}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f)
+    os.replace(tmp, path)
+
+
+def _flush_forever():
+    """Write a snapshot every ``FLUSH_INTERVAL`` seconds (metrics thread)."""
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            _write_snapshot()
+        except OSError:
+            pass
+
+
+def configure(metrics_dir):
+    """
+    Share this process' metrics through ``metrics_dir``.
+
+    Each process writes a snapshot there every ``FLUSH_INTERVAL`` seconds;
+    ``render`` sums every snapshot in the directory, so any HTTP worker can
+    answer for the whole bridge.
+    """
+    if not metrics_dir:
+        return
+    os.makedirs(metrics_dir, exist_ok=True)
+    _STATE["dir"] = metrics_dir
+    if _STATE["thread"] is None:
+        t = threading.Thread(target=_flush_forever, name="runyx-metrics", daemon=True)
+        t.start()
+        _STATE["thread"] = t
+
+
+def _load_snapshots():
+    """Return this process' live snapshot plus the others' latest ones."""
+    own = snapshot()
+    snapshots = [own]
+    metrics_dir = _STATE["dir"]
+    if not metrics_dir:
+        return snapshots
+    for name in os.listdir(metrics_dir):
+        if not name.endswith(".json") or name == f"{own['pid']}.json":
+            continue
+        try:
+            with open(os.path.join(metrics_dir, name), encoding="utf-8") as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def _format_labels(labels):
+    """Render label pairs as ``{name="value",...}`` with Prometheus escaping."""
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value):
+    """Render a sample value, dropping the ``.0`` of whole numbers."""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render():
+    """Render the aggregated metrics in the Prometheus text format."""
+    now = time.time()
+    totals = {}
+    histograms = {}
+    for snap in _load_snapshots():
+        for name, labels, value in snap["counters"]:
+            key = (name, _key(labels))
+            totals[key] = totals.get(key, 0) + value
+        if now - snap["time"] <= STALE_AFTER:
+            for name, labels, value in snap["gauges"]:
+                key = (name, _key(labels))
+                totals[key] = totals.get(key, 0) + value
+        for name, labels, counts, total, count in snap["histograms"]:
+            key = (name, _key(labels))
+            entry = histograms.setdefault(key, [[0] * len(counts), 0.0, 0])
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += total
+            entry[2] += count
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "histogram":
+            for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket in zip(list(buckets) + ["+Inf"], counts):
+                    cumulative += bucket
+                    le = bound if bound == "+Inf" else _format_value(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        else:
+            for (metric, labels), value in sorted(totals.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
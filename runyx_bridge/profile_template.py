@@ -0,0 +1,112 @@
+"""Prebuilt browser profiles cloned per session to skip cold starts."""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import subprocess
+
+MARKER = "runyx-template.json"
+
+# per-run state that must not travel from the template into a clone
+SKIP = (
+    "SingletonLock",
+    "SingletonCookie",
+    "SingletonSocket",
+    "lockfile",
+    "Cache",
+    "Code Cache",
+    "GPUCache",
+    "ShaderCache",
+    "GrShaderCache",
+    "DawnCache",
+    "DawnGraphiteCache",
+    "DawnWebGPUCache",
+    "Crashpad",
+)
+
+
+def fingerprint(browser, extension_path, import_project_path=None):
+    """Hash what a template depends on: browser, extension folder and project."""
+    h = hashlib.sha256()
+    h.update(browser.encode("utf-8"))
+    ext_path = os.path.abspath(extension_path)
+    # the unpacked extension's ID is derived from its path
+    h.update(ext_path.encode("utf-8"))
+    for path in (os.path.join(ext_path, "manifest.json"), import_project_path):
+        if path and os.path.isfile(path):
+            file_hash = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    file_hash.update(chunk)
+            h.update(file_hash.digest())
+    return h.hexdigest()
+
+
+def is_ready(template_dir, expected):
+    """Return True when ``template_dir`` holds a finished template for ``expected``."""
+    try:
+        with open(os.path.join(template_dir, MARKER), "r", encoding="utf-8") as f:
+            return json.load(f).get("fingerprint") == expected
+    except (OSError, ValueError):
+        return False
+
+
+def _prune(root):
+    """Remove lock files and caches from ``root`` and its profile folders."""
+    for base, dirs, files in os.walk(root):
+        for name in list(dirs):
+            if name in SKIP:
+                shutil.rmtree(os.path.join(base, name), ignore_errors=True)
+                dirs.remove(name)
+        for name in files:
+            if name in SKIP:
+                try:
+                    os.remove(os.path.join(base, name))
+                except OSError:
+                    pass
+        # profile folders sit one level below the user data dir
+        if base != root:
+            dirs[:] = []
+
+
+def finalize(template_dir, expected):
+    """Strip per-run state from a freshly built profile and mark it ready."""
+    _prune(template_dir)
+    with open(os.path.join(template_dir, MARKER), "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": expected}, f)
+
+
+def clone(template_dir, dest):
+    """
+    Copy ``template_dir`` to a fresh ``dest``; return the method used.
+
+    Uses copy-on-write clones where the filesystem supports them
+    (``cp --reflink`` on Linux, ``cp -c`` on macOS) and a plain copy
+    otherwise. Hardlinks are not an option: Chromium rewrites profile
+    files (LevelDB, SQLite) in place, which would corrupt the template.
+    """
+    shutil.rmtree(dest, ignore_errors=True)
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    src = os.path.abspath(template_dir)
+    cmd = None
+    if sys.platform.startswith("linux"):
+        cmd = ["cp", "-a", "--reflink=auto", src, dest]
+    elif sys.platform == "darwin":
+        cmd = ["cp", "-c", "-R", "-p", src, dest]
+    method = "copy"
+    if cmd and shutil.which("cp"):
+        try:
+            subprocess.run(cmd, check=True, capture_output=True)
+            method = "cp"
+        except (OSError, subprocess.CalledProcessError):
+            shutil.rmtree(dest, ignore_errors=True)
+    if method == "copy":
+        shutil.copytree(src, dest, ignore=shutil.ignore_patterns(*SKIP))
+    _prune(dest)
+    try:
+        os.remove(os.path.join(dest, MARKER))
+    except OSError:
+        pass
+    return method
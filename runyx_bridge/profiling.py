@@ -0,0 +1,347 @@
+"""On-demand profiling of @receive routes and the WebSocket loop."""
+
+import os
+import sys
+import json
+import time
+import uuid
+import cProfile
+import threading
+from colorama import Fore, init
+
+init(autoreset=True)
+
+MODES = ("sample", "cprofile")
+WS_TARGET = "ws"
+MAX_SECONDS = 600
+POLL_INTERVAL = 0.5
+ENV_VAR = "RUNYX_PROFILE"
+ADMIN_PATH = "/_runyx/profile"
+
+_LOCK = threading.Lock()
+_SESSIONS = {}
+_STATE = {"dir": None, "http": False, "loop": None, "loop_thread": None, "watcher": None, "seen": set()}
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame):
+    """Render a frame's stack root-first in the collapsed (folded) format."""
+    names = []
+    while frame is not None:
+        names.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class ProfileSession:
+    """
+    Profile one target for ``seconds`` and write the result to ``out_dir``.
+
+    ``target`` is a @receive route path or ``"ws"`` for the WebSocket loop.
+    ``mode="sample"`` walks the target threads' stacks every ``interval``
+    seconds and writes collapsed stacks (``.folded``, for flamegraph.pl or
+    speedscope). ``mode="cprofile"`` writes a ``.pstats`` file; route calls
+    are then profiled one at a time. Coroutine handlers are profiled on
+    their event loop thread, so other tasks that run there while the
+    handler awaits show up as well.
+    """
+    def __init__(self, target, mode="sample", seconds=30, interval=0.005, out_dir="profiles"):
+        if mode not in MODES:
+            raise ValueError(f"[PROFILE] mode must be one of {MODES}, got {mode!r}")
+        self.target = target
+        self.mode = mode
+        self.seconds = min(float(seconds), MAX_SECONDS)
+        self.interval = float(interval)
+        self.out_dir = out_dir
+        self.threads = set()
+        self._active = {}
+        self.stacks = {}
+        self.profiler = cProfile.Profile() if mode == "cprofile" else None
+        self._call_lock = threading.Lock()
+        self._done = threading.Event()
+        self._sampler = None
+        self.path = None
+
+    def start(self):
+        """Register the session and stop it after ``seconds``."""
+        with _LOCK:
+            if self.target in _SESSIONS:
+                return False
+            _SESSIONS[self.target] = self
+        if self.target == WS_TARGET:
+            self._attach_loop()
+        if self.mode == "sample":
+            self._sampler = threading.Thread(target=self._sample, name="runyx-profile-sampler", daemon=True)
+            self._sampler.start()
+        timer = threading.Timer(self.seconds, self.stop)
+        timer.daemon = True
+        timer.start()
+        print(Fore.MAGENTA + f"[PROFILE] {self.mode} {self.target} for {self.seconds:g}s")
+        return True
+
+    def _attach_loop(self):
+        loop = _STATE["loop"]
+        if loop is None:
+            return
+        self.threads.add(_STATE["loop_thread"])
+        if self.profiler is not None:
+            loop.call_soon_threadsafe(self.profiler.enable)
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in list(self.threads):
+                frame = frames.get(ident)
+                if frame is not None:
+                    stack = _collapse(frame)
+                    self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def _enter(self, ident):
+        """Count one more profiled call on thread ``ident`` (sample mode)."""
+        with _LOCK:
+            self._active[ident] = self._active.get(ident, 0) + 1
+            self.threads.add(ident)
+
+    def _leave(self, ident):
+        """Stop sampling ``ident`` once its last profiled call returns."""
+        with _LOCK:
+            self._active[ident] -= 1
+            if not self._active[ident]:
+                del self._active[ident]
+                self.threads.discard(ident)
+
+    def wrap(self, call):
+        """Return ``call`` instrumented for this session (runs on the worker)."""
+        def profiled(*args):
+            ident = threading.get_ident()
+            if self.profiler is None:
+                self._enter(ident)
+                try:
+                    return call(*args)
+                finally:
+                    self._leave(ident)
+            if self._done.is_set() or not self._call_lock.acquire(blocking=False):
+                return call(*args)
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # another profiler is active in this interpreter
+                self._call_lock.release()
+                return call(*args)
+            try:
+                return call(*args)
+            finally:
+                self.profiler.disable()
+                self._call_lock.release()
+
+        return profiled
+
+    def wrap_async(self, call):
+        """Like ``wrap`` for a coroutine function (runs on its event loop)."""
+        async def profiled(*args):
+            ident = threading.get_ident()
+            if self.profiler is None:
+                # several handlers may be suspended on the same loop thread
+                self._enter(ident)
+                try:
+                    return await call(*args)
+                finally:
+                    self._leave(ident)
+            if self._done.is_set() or not self._call_lock.acquire(blocking=False):
+                return await call(*args)
+            try:
+                self.profiler.enable()
+            except ValueError:
+                self._call_lock.release()
+                return await call(*args)
+            try:
+                return await call(*args)
+            finally:
+                self.profiler.disable()
+                self._call_lock.release()
+
+        return profiled
+
+    def stop(self):
+        """End the session and write its output file; return the path."""
+        with _LOCK:
+            if self._done.is_set():
+                return self.path
+            if _SESSIONS.get(self.target) is self:
+                del _SESSIONS[self.target]
+            self._done.set()
+        if self._sampler is not None:
+            self._sampler.join(5)
+        if self.target == WS_TARGET and self.profiler is not None and _STATE["loop"] is not None:
+            disabled = threading.Event()
+
+            def _disable():
+                self.profiler.disable()
+                disabled.set()
+
+            _STATE["loop"].call_soon_threadsafe(_disable)
+            disabled.wait(5)
+        with self._call_lock:
+            self.path = self._dump()
+        return self.path
+
+    def _dump(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        slug = self.target.strip("/").replace("/", "_") or "root"
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        base = os.path.join(self.out_dir, f"{slug}-{self.mode}-{os.getpid()}-{stamp}")
+        if self.profiler is not None:
+            path = f"{base}.pstats"
+            self.profiler.dump_stats(path)
+        else:
+            path = f"{base}.folded"
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in sorted(self.stacks.items()):
+                    f.write(f"{stack} {count}\n")
+        print(Fore.MAGENTA + f"[PROFILE] wrote {path}")
+        return path
+
+
+def wrap(target, call):
+    """Instrument ``call`` when ``target`` is being profiled, else return it."""
+    session = _SESSIONS.get(target)
+    return call if session is None else session.wrap(call)
+
+
+def wrap_async(target, call):
+    """Instrument coroutine function ``call`` when ``target`` is being profiled."""
+    session = _SESSIONS.get(target)
+    return call if session is None else session.wrap_async(call)
+
+
+def register_loop(loop):
+    """Record the WebSocket loop (call from the loop's thread)."""
+    _STATE["loop"] = loop
+    _STATE["loop_thread"] = threading.get_ident()
+
+
+def start(target, mode="sample", seconds=30, interval=0.005, out_dir=None):
+    """Start a session in this process; return it, or None if one is running."""
+    session = ProfileSession(
+        target, mode=mode, seconds=seconds, interval=interval,
+        out_dir=out_dir or _STATE["dir"] or "profiles",
+    )
+    return session if session.start() else None
+
+
+def request(target, mode="sample", seconds=30, interval=0.005):
+    """
+    Ask every bridge process watching the profile directory to profile ``target``.
+
+    Writes a control file that the processes pick up within ``POLL_INTERVAL``.
+    """
+    if mode not in MODES:
+        raise ValueError(f"[PROFILE] mode must be one of {MODES}, got {mode!r}")
+    control = os.path.join(_STATE["dir"], ".requests")
+    os.makedirs(control, exist_ok=True)
+    request_id = uuid.uuid4().hex[:12]
+    spec = {"target": target, "mode": mode, "seconds": seconds, "interval": interval, "time": time.time()}
+    path = os.path.join(control, f"{request_id}.json")
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(spec, f)
+    os.replace(f"{path}.tmp", path)
+    return {"id": request_id, "dir": _STATE["dir"], **spec}
+
+
+def _handles(target):
+    """Return True when this process can profile ``target``."""
+    if target == WS_TARGET:
+        return _STATE["loop"] is not None
+    if not _STATE["http"]:
+        return False
+    from .decorators import _ROUTES
+    return any(route["path"] == target for route in _ROUTES)
+
+
+def _watch(started_at):
+    control = os.path.join(_STATE["dir"], ".requests")
+    while True:
+        time.sleep(POLL_INTERVAL)
+        try:
+            names = os.listdir(control)
+        except OSError:
+            continue
+        for name in names:
+            if not name.endswith(".json") or name in _STATE["seen"]:
+                continue
+            _STATE["seen"].add(name)
+            try:
+                with open(os.path.join(control, name), encoding="utf-8") as f:
+                    spec = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if spec.get("time", 0) < started_at or not _handles(spec.get("target")):
+                continue
+            try:
+                start(spec["target"], spec.get("mode", "sample"), spec.get("seconds", 30), spec.get("interval", 0.005))
+            except (KeyError, TypeError, ValueError) as exc:
+                print(Fore.RED + f"[PROFILE] bad request {name}: {exc}")
+
+
+def _parse_env(value):
+    """Parse ``RUNYX_PROFILE=target[,mode[,seconds]]``."""
+    parts = [p.strip() for p in value.split(",")]
+    spec = {"target": parts[0]}
+    if len(parts) > 1 and parts[1]:
+        spec["mode"] = parts[1]
+    if len(parts) > 2 and parts[2]:
+        spec["seconds"] = float(parts[2])
+    return spec
+
+
+def configure(profile_dir=None, http=False):
+    """
+    Set up profiling for this server process.
+
+    ``http`` says whether the process serves @receive routes; the WS loop
+    is known once ``register_loop`` ran. ``RUNYX_PROFILE`` (``/route`` or
+    ``ws``, optional mode and seconds) starts a session right away. With
+    ``profile_dir`` the process also watches that directory for requests
+    from the admin endpoint and writes its profiles there.
+    """
+    _STATE["http"] = _STATE["http"] or http
+    if profile_dir:
+        _STATE["dir"] = os.path.abspath(profile_dir)
+        os.makedirs(_STATE["dir"], exist_ok=True)
+        if _STATE["watcher"] is None:
+            t = threading.Thread(target=_watch, args=(time.time(),), name="runyx-profile-watch", daemon=True)
+            t.start()
+            _STATE["watcher"] = t
+
+    value = os.environ.get(ENV_VAR)
+    if value:
+        spec = _parse_env(value)
+        if _handles(spec["target"]):
+            start(**spec)
+
+
+def admin(method, body):
+    """
+    Serve the admin endpoint: ``POST`` starts a session, ``GET`` lists profiles.
+
+    Returns ``(status, result)``.
+    """
+    if _STATE["dir"] is None:
+        return 404, {"error": "profiling is disabled"}
+    if method == "GET":
+        names = sorted(n for n in os.listdir(_STATE["dir"]) if n.endswith((".pstats", ".folded")))
+        return 200, {"dir": _STATE["dir"], "profiles": names}
+    try:
+        spec = json.loads(body or b"{}")
+        return 202, request(
+            spec["target"],
+            mode=spec.get("mode", "sample"),
+            seconds=min(float(spec.get("seconds", 30)), MAX_SECONDS),
+            interval=float(spec.get("interval", 0.005)),
+        )
+    except (KeyError, TypeError, ValueError) as exc:
+        return 400, {"error": str(exc)}
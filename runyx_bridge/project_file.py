@@ -0,0 +1,264 @@
+"""Streaming validation and copy of Runyx project export files."""
+
+import os
+import re
+import json
+import heapq
+
+CHUNK_SIZE = 64 * 1024
+
+_WS = re.compile(r"[ \t\n\r]*")
+
+
+class _Reader:
+    """Pull JSON values one at a time from a text file, keeping a small buffer."""
+    def __init__(self, f, chunk_size=None):
+        self.f = f
+        self.chunk_size = chunk_size or CHUNK_SIZE
+        self.buf = ""
+        self.pos = 0
+        self.base = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    @property
+    def offset(self):
+        return self.base + self.pos
+
+    def _fill(self, size=None):
+        if self.eof:
+            return False
+        data = self.f.read(size or self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.base += self.pos
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character ("" at end of file)."""
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char, message=None):
+        if self.peek() != char:
+            raise ValueError(message or f"[Project] expected {char!r} at offset {self.offset}")
+        self.pos += 1
+
+    def value(self, with_text=False):
+        """Decode the complete value at the cursor (and its source text)."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # a number ending at the buffer edge may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    start, self.pos = self.pos, end
+                    return (value, self.buf[start:end]) if with_text else value
+            except json.JSONDecodeError as exc:
+                if self.eof:
+                    raise ValueError(f"[Project] invalid JSON at offset {self.offset}: {exc.msg}") from exc
+            # grow geometrically so large values are not re-parsed too often
+            self._fill(max(self.chunk_size, len(self.buf) - self.pos))
+
+    def _items(self, open_char, close_char):
+        self.expect(open_char)
+        if self.peek() == close_char:
+            self.pos += 1
+            return
+        while True:
+            yield
+            char = self.peek()
+            self.pos += 1
+            if char == close_char:
+                return
+            if char != ",":
+                raise ValueError(f"[Project] expected ',' or {close_char!r} at offset {self.offset - 1}")
+
+    def keys(self):
+        """Yield the keys of the object at the cursor; consume each value in between."""
+        for _ in self._items("{", "}"):
+            key = self.value()
+            if not isinstance(key, str):
+                raise ValueError(f"[Project] object keys must be strings (offset {self.offset})")
+            self.expect(":")
+            yield key
+
+    def elements(self):
+        """Yield once per element of the array at the cursor."""
+        yield from self._items("[", "]")
+
+
+def _dump(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def copy_project(src, dest=None, keep_runs=None, on_run=None, merge_runs=None):
+    """
+    Validate a project export and copy it to ``dest`` in one streaming pass.
+
+    Memory stays bounded by the largest single value (a run, a step list),
+    not by the file size. ``keep_runs`` limits each workflow's ``runs``
+    history: None keeps everything, 0 drops it, N keeps the first N (the
+    newest; exports store runs newest-first). ``on_run(run, workflow_id)``
+    sees every run read, kept or not. ``merge_runs(workflow_id)`` may return
+    more runs (newest first) to merge into a workflow's history by
+    ``startTime``; runs whose id the workflow already has in ``src`` are
+    skipped (a first pass over ``src`` collects those ids, which stay in
+    memory). ``dest`` is written through a temp file and only replaced when
+    the whole export is valid; with ``dest=None`` the file is only
+    validated.
+
+    Returns ``{"project_id", "workflows", "runs", "runs_kept"}``.
+    """
+    summary = {"project_id": None, "workflows": 0, "runs": 0, "runs_kept": 0}
+    if merge_runs is not None:
+        merge_runs = _skip_file_runs(merge_runs, _run_ids(src))
+    tmp = f"{dest}.tmp" if dest else None
+    out = None
+    try:
+        with open(src, "r", encoding="utf-8") as f:
+            if tmp:
+                out = open(tmp, "w", encoding="utf-8")
+            write = out.write if out else (lambda _text: None)
+            project = _copy_export(_Reader(f), write, summary, keep_runs, on_run, merge_runs)
+        if out:
+            out.close()
+            out = None
+            os.replace(tmp, dest)
+    except BaseException:
+        if out:
+            out.close()
+        if tmp and os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    summary["project_id"] = project["id"]
+    return summary
+
+
+def _run_ids(src):
+    """Validate ``src`` and map each workflow id to the ids of its runs."""
+    ids = {}
+
+    def _collect(run, workflow_id):
+        if isinstance(run, dict) and isinstance(run.get("id"), str):
+            ids.setdefault(workflow_id, set()).add(run["id"])
+
+    copy_project(src, on_run=_collect)
+    return ids
+
+
+def _skip_file_runs(merge_runs, file_ids):
+    """Wrap ``merge_runs`` to drop runs the file already has, whatever their startTime."""
+    def merged(workflow_id):
+        known = file_ids.get(workflow_id, ())
+        return (run for run in merge_runs(workflow_id) if not (isinstance(run, dict) and run.get("id") in known))
+
+    return merged
+
+
+def _copy_export(reader, write, summary, keep_runs, on_run, merge_runs):
+    if reader.peek() != "{":
+        raise ValueError("[Project] import JSON must be an object.")
+    project = None
+    has_workflows = False
+    write("{")
+    for index, key in enumerate(reader.keys()):
+        write(("," if index else "") + _dump(key) + ":")
+        if key == "workflows":
+            if reader.peek() != "[":
+                raise ValueError("[Project] import JSON must include { project, workflows }.")
+            has_workflows = True
+            _copy_workflows(reader, write, summary, keep_runs, on_run, merge_runs)
+        else:
+            value, text = reader.value(with_text=True)
+            if key == "project":
+                project = value
+            write(text)
+    write("}")
+    if reader.peek() != "":
+        raise ValueError(f"[Project] unexpected data after the export at offset {reader.offset}")
+
+    if not isinstance(project, dict) or not has_workflows:
+        raise ValueError("[Project] import JSON must include { project, workflows }.")
+    if not isinstance(project.get("id"), str) or not project.get("id"):
+        raise ValueError("[Project] import JSON project.id must be a string.")
+    if not summary["workflows"]:
+        raise ValueError("[Project] import JSON is missing project/workflows.")
+    return project
+
+
+def _copy_workflows(reader, write, summary, keep_runs, on_run, merge_runs):
+    write("[")
+    for index, _ in enumerate(reader.elements()):
+        if reader.peek() != "{":
+            raise ValueError("[Project] each workflow must have a string id.")
+        write("," if index else "")
+        workflow_id = None
+        has_runs = False
+        write("{")
+        for key_index, key in enumerate(reader.keys()):
+            write(("," if key_index else "") + _dump(key) + ":")
+            if key == "runs" and reader.peek() == "[":
+                extra = None
+                if merge_runs is not None:
+                    if not isinstance(workflow_id, str):
+                        raise ValueError("[Project] merging runs needs each workflow's id before its runs.")
+                    extra = merge_runs(workflow_id)
+                _copy_runs(_file_runs(reader), write, summary, keep_runs, on_run, workflow_id, extra)
+                has_runs = True
+                continue
+            value, text = reader.value(with_text=True)
+            if key == "id":
+                workflow_id = value
+            write(text)
+        if not isinstance(workflow_id, str):
+            raise ValueError("[Project] each workflow must have a string id.")
+        if merge_runs is not None and not has_runs:
+            # the workflow has at least its "id" key, so a comma always precedes
+            write(',"runs":')
+            _copy_runs(iter(()), write, summary, keep_runs, on_run, workflow_id, merge_runs(workflow_id))
+        write("}")
+        summary["workflows"] += 1
+    write("]")
+
+
+def _file_runs(reader):
+    for _ in reader.elements():
+        yield reader.value(with_text=True)
+
+
+def _start_time(run):
+    start = run.get("startTime") if isinstance(run, dict) else None
+    return start if isinstance(start, (int, float)) else 0
+
+
+def _merge_newest_first(file_runs, extra):
+    """Merge the file's runs with ``extra`` (stored runs not in the file), newest first."""
+    return heapq.merge(
+        file_runs,
+        ((run, None) for run in extra),
+        key=lambda item: -_start_time(item[0]),
+    )
+
+
+def _copy_runs(runs, write, summary, keep_runs, on_run, workflow_id, extra=None):
+    if extra is not None:
+        runs = _merge_newest_first(runs, extra)
+    write("[")
+    kept = 0
+    for run, text in runs:
+        summary["runs"] += 1
+        if on_run is not None:
+            on_run(run, workflow_id)
+        if keep_runs is None or kept < keep_runs:
+            write(("," if kept else "") + (text if text is not None else _dump(run)))
+            kept += 1
+    summary["runs_kept"] += kept
+    write("]")
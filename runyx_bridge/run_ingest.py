@@ -0,0 +1,190 @@
+"""Run-record ingestion: acknowledge fast, commit to SQLite in batches."""
+
+import time
+import threading
+from colorama import Fore, init
+from werkzeug.exceptions import BadRequest, TooManyRequests
+from .decorators import receive
+from .history import RunHistory
+
+init(autoreset=True)
+
+_FILTERS = ("workflow_id", "status", "trigger")
+# query string aliases, extension-style names first
+_QUERY_NAMES = {"workflow_id": ("workflowId", "workflow"), "status": ("status",), "trigger": ("trigger",)}
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def _runs_from_payload(payload):
+    """Accept one run, a list of runs or ``{"workflowId"?, "runs": [...]}``."""
+    if isinstance(payload, list):
+        return payload, None
+    if isinstance(payload, dict):
+        if isinstance(payload.get("runs"), list):
+            return payload["runs"], payload.get("workflowId")
+        return [payload], None
+    raise BadRequest("expected a run object, a list of runs or {\"runs\": [...]}")
+
+
+def _int_arg(query, name):
+    value = query.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer") from None
+
+
+def _limit(query):
+    """Return ``limit`` capped at MAX_LIMIT (DEFAULT_LIMIT when absent)."""
+    limit = _int_arg(query, "limit")
+    if limit is None:
+        return DEFAULT_LIMIT
+    if limit < 1:
+        raise BadRequest("limit must be at least 1")
+    return min(limit, MAX_LIMIT)
+
+
+def _filters(query):
+    filters = {}
+    for key in _FILTERS:
+        for name in _QUERY_NAMES[key]:
+            if query.get(name):
+                filters[key] = query[name]
+                break
+    filters["since"] = _int_arg(query, "since")
+    filters["until"] = _int_arg(query, "until")
+    return filters
+
+
+class RunIngest:
+    """
+    Buffer incoming run records and commit them in batches.
+
+    A background thread writes whenever ``batch_size`` runs are pending or
+    ``flush_interval`` seconds passed since the first one arrived, in one
+    transaction per batch (WAL, ``synchronous=NORMAL``: no fsync per run).
+    At most ``max_pending`` runs wait in memory; submissions beyond that
+    are refused. Runs still pending when the process is killed are lost.
+    """
+    def __init__(self, db="runs.sqlite3", batch_size=500, flush_interval=0.5, max_pending=10000):
+        self.db = db
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.max_pending = max(self.batch_size, int(max_pending))
+        self.submitted = 0
+        self.committed = 0
+        self.failed = 0
+        self._history = None
+        self._pending = []
+        self._flush_requested = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    @property
+    def history(self):
+        """The ``RunHistory`` behind the route (opened on first use)."""
+        with self._cond:
+            if self._history is None:
+                self._history = RunHistory(self.db)
+            return self._history
+
+    def _ensure_started(self):
+        """Start the writer thread on first use (i.e. inside the server process)."""
+        history = self.history
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(history,), name="runyx-run-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, runs, workflow_id=None):
+        """Validate and queue runs; return how many, or None when the buffer is full."""
+        rows = RunHistory.rows(runs, workflow_id)
+        self._ensure_started()
+        with self._cond:
+            if len(self._pending) + len(rows) > self.max_pending:
+                return None
+            self._pending.extend(rows)
+            self.submitted += len(rows)
+            self._cond.notify_all()
+        return len(rows)
+
+    def flush(self, timeout=None):
+        """Block until every run submitted so far is written; return True if so."""
+        with self._cond:
+            target = self.submitted
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self.committed + self.failed >= target, timeout)
+
+    def _run(self, history):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.batch_size and not self._flush_requested:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                rows, self._pending = self._pending, []
+                self._flush_requested = False
+            try:
+                history.insert_rows(rows)
+                written, lost = len(rows), 0
+            except Exception as exc:
+                written, lost = 0, len(rows)
+                print(Fore.RED + f"[HTTP] run batch of {len(rows)} failed: {exc}")
+            with self._cond:
+                self.committed += written
+                self.failed += lost
+                self._cond.notify_all()
+
+    def stats(self):
+        """Return run counts: submitted, committed, failed and still pending."""
+        with self._cond:
+            return {
+                "submitted": self.submitted,
+                "committed": self.committed,
+                "failed": self.failed,
+                "pending": len(self._pending),
+            }
+
+
+def receive_runs(path="/runs", db="runs.sqlite3", batch_size=500, flush_interval=0.5,
+                 max_pending=10000, workers=None, queue_size=64):
+    """
+    Register the built-in run ingestion and query routes; return the ``RunIngest``.
+
+    ``POST path`` takes one run, a list of runs or ``{"workflowId", "runs"}``
+    and answers ``{"queued": n}`` before the write (429 when the buffer is
+    full, 400 for runs without a string ``id`` or ``workflowId``).
+    ``GET path`` lists runs newest first, filtered by ``workflowId``,
+    ``status``, ``trigger``, ``since``/``until`` (epoch ms) and ``limit``
+    (default ``DEFAULT_LIMIT``, capped at ``MAX_LIMIT``, 400 below 1).
+    ``GET path/stats`` returns counts and p50/p95 duration for the same
+    filters.
+    """
+    ingest = RunIngest(db, batch_size=batch_size, flush_interval=flush_interval, max_pending=max_pending)
+
+    def runs_route(payload, meta):
+        query = meta["query"]
+        if meta["method"] == "GET":
+            return ingest.history.query(limit=_limit(query), **_filters(query))
+        runs, workflow_id = _runs_from_payload(payload)
+        try:
+            queued = ingest.submit(runs, workflow_id)
+        except ValueError as exc:
+            raise BadRequest(str(exc)) from None
+        if queued is None:
+            raise TooManyRequests("run buffer full", retry_after=1)
+        return {"queued": queued}
+
+    def runs_stats_route(payload, meta):
+        return {**ingest.history.duration_stats(**_filters(meta["query"])), "ingest": ingest.stats()}
+
+    receive(path, methods=["GET", "POST", "OPTIONS"], workers=workers, queue_size=queue_size)(runs_route)
+    receive(f"{path.rstrip('/')}/stats", methods=["GET", "OPTIONS"])(runs_stats_route)
+    return ingest
@@ -0,0 +1,97 @@
+"""Single-process runtime serving HTTP and WebSocket on one event loop."""
+
+import asyncio
+import websockets
+from colorama import Fore, init
+from . import metrics, profiling
+from .asgi import create_asgi_app
+from .http_server import _print_banner as _print_http_banner
+from .websocket_server import (
+    Hub,
+    SEND_QUEUE_SIZE,
+    set_hub,
+    _print_banner as _print_ws_banner,
+)
+
+init(autoreset=True)
+
+
+async def _run_unified(host, http_port, ws_port, requests, websocket, hub,
+                       metrics_endpoint=False, profile_dir=None):
+    """Serve HTTP (uvicorn) and the WS hub from the running loop."""
+    hub.loop = asyncio.get_running_loop()
+    profiling.register_loop(hub.loop)
+    profiling.configure(profile_dir, http=requests)
+    same_port = requests and websocket and ws_port in (None, http_port)
+
+    ws_server = None
+    if websocket and not same_port:
+        _print_ws_banner(ws_port)
+        ws_server = await websockets.serve(hub.handle, host, ws_port)
+
+    try:
+        if requests:
+            import uvicorn
+
+            _print_http_banner(http_port, backend="unified")
+            if same_port:
+                _print_ws_banner(http_port)
+            config = uvicorn.Config(
+                create_asgi_app(
+                    hub=hub if same_port else None,
+                    metrics_endpoint=metrics_endpoint,
+                    profile_endpoint=profile_dir is not None,
+                ),
+                host=host,
+                port=http_port,
+                log_level="error",
+                access_log=False,
+            )
+            await uvicorn.Server(config).serve()
+        else:
+            await asyncio.Future()
+    finally:
+        if ws_server is not None:
+            ws_server.close()
+            await ws_server.wait_closed()
+
+
+def start_unified_server(
+    host,
+    http_port,
+    ws_port,
+    requests=True,
+    websocket=True,
+    queue_size=SEND_QUEUE_SIZE,
+    slow_consumer="drop",
+    metrics_dir=None,
+    profile_dir=None,
+):
+    """
+    Entry point for the unified Bridge process.
+
+    HTTP routes and the WebSocket hub share one asyncio loop, so @receive
+    handlers can call ``broadcast``/``push`` to reach connected clients in
+    memory. With ``ws_port`` equal to ``http_port`` (or None) both protocols
+    are served on the same port. With ``metrics_dir`` the HTTP side also
+    answers ``GET /metrics``; with ``profile_dir`` it serves the profiling
+    admin endpoint.
+    """
+    if requests:
+        try:
+            import uvicorn  # noqa: F401
+        except ImportError as exc:
+            raise RuntimeError(
+                "[Bridge] mode='unified' requires uvicorn: pip install uvicorn"
+            ) from exc
+
+    metrics.configure(metrics_dir)
+    hub = set_hub(Hub(queue_size=queue_size, slow_consumer=slow_consumer))
+    try:
+        asyncio.run(_run_unified(
+            host, http_port, ws_port, requests, websocket, hub,
+            metrics_endpoint=metrics_dir is not None,
+            profile_dir=profile_dir,
+        ))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        print(Fore.YELLOW + "[Bridge] stopping...")
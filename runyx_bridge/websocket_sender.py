@@ -1,16 +1,259 @@
-"""Simple WebSocket sender for triggering workflows."""
+"""Pooled WebSocket sender for triggering workflows."""
 
+import json
+import atexit
 import asyncio
+import itertools
+import threading
 import websockets
+from urllib.parse import urlsplit, urlunsplit
+from websockets.protocol import State
+
+
+def _build_frame(messages):
+    """Return a single message as-is, or several as one batch frame."""
+    if len(messages) == 1:
+        return messages[0]
+    texts = [m.decode("utf-8") if isinstance(m, bytes) else m for m in messages]
+    return json.dumps({"type": "batch", "messages": texts})
+
+
+def _publisher_url(endpoint):
+    """Add ``role=publisher`` to ``endpoint`` so the hub sends it no broadcasts."""
+    parts = urlsplit(endpoint)
+    query = "&".join(q for q in (parts.query, "role=publisher") if q)
+    return urlunsplit(parts._replace(query=query))
+
+
+def _is_open(ws):
+    """Return True while a client connection can still send."""
+    return ws is not None and ws.state is State.OPEN
+
+
+async def _drain(ws):
+    """Discard incoming messages so the connection keeps reading pings."""
+    try:
+        async for _ in ws:
+            pass
+    except Exception:
+        pass
+
+
+class _Pool:
+    """Round-robin set of persistent connections to one endpoint."""
+    def __init__(self, endpoint, size, connect_kwargs):
+        self.endpoint = endpoint
+        self.connections = [None] * size
+        self._locks = [asyncio.Lock() for _ in range(size)]
+        self._slots = itertools.cycle(range(size))
+        self._connect_kwargs = connect_kwargs
+
+    def ensure(self, size):
+        """Grow the pool to at least ``size`` connection slots."""
+        if len(self.connections) >= size:
+            return
+        while len(self.connections) < size:
+            self.connections.append(None)
+            self._locks.append(asyncio.Lock())
+        # round-robin over the new slots too
+        self._slots = itertools.cycle(range(size))
+
+    async def acquire(self, slot=None):
+        """Return ``(slot, ws)``, (re)connecting the slot if needed."""
+        if slot is None:
+            slot = next(self._slots)
+        ws = self.connections[slot]
+        if _is_open(ws):
+            return slot, ws
+        async with self._locks[slot]:
+            ws = self.connections[slot]
+            if not _is_open(ws):
+                ws = await websockets.connect(_publisher_url(self.endpoint), **self._connect_kwargs)
+                asyncio.ensure_future(_drain(ws))
+                self.connections[slot] = ws
+        return slot, ws
+
+    def discard(self, slot, ws):
+        """Forget a broken connection so the next acquire reconnects."""
+        if self.connections[slot] is ws:
+            self.connections[slot] = None
+
+    async def close(self):
+        """Close every open connection in the pool."""
+        for slot, ws in enumerate(self.connections):
+            self.connections[slot] = None
+            if ws is not None:
+                try:
+                    await ws.close()
+                except Exception:
+                    pass
+
+
+class Sender:
+    """
+    Send WebSocket messages over persistent, pooled connections.
+
+    Connections are opened lazily, ``pool_size`` per endpoint, kept alive
+    with pings and reopened when they drop. Use ``send_async`` from a
+    running event loop, or ``send`` from plain code (it runs the coroutine
+    on a background loop owned by the sender).
+    """
+    def __init__(self, pool_size=1, ping_interval=20, open_timeout=10, retries=1):
+        self.pool_size = max(1, int(pool_size))
+        self.retries = retries
+        self._connect_kwargs = {
+            "ping_interval": ping_interval,
+            "open_timeout": open_timeout,
+        }
+        self._pools = {}
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
 
+    def _pool(self, endpoint):
+        """Return the pool for ``endpoint`` on the running event loop."""
+        key = (endpoint, asyncio.get_running_loop())
+        pool = self._pools.get(key)
+        if pool is None:
+            # loops closed since (e.g. by asyncio.run) can never use their pools
+            for stale in [k for k in self._pools if k[1].is_closed()]:
+                del self._pools[stale]
+            pool = _Pool(endpoint, self.pool_size, self._connect_kwargs)
+            self._pools[key] = pool
+        return pool
 
-async def _send(endpoint, message):
-    """Send a single message to a WebSocket endpoint."""
-    async with websockets.connect(endpoint) as ws:
-        await ws.send(message)
+    async def send_async(self, endpoint, message):
+        """Send one message, reconnecting and retrying if the socket dropped."""
+        pool = self._pool(endpoint)
+        attempt = 0
+        while True:
+            slot, ws = await pool.acquire()
+            try:
+                await ws.send(message)
+                return
+            except websockets.ConnectionClosed:
+                pool.discard(slot, ws)
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+
+    async def send_many_async(self, endpoint, messages, concurrency=4, batch_frames=1):
+        """
+        Send many messages, pipelined over ``concurrency`` connections.
+
+        With ``batch_frames > 1`` up to that many text messages are coalesced
+        into one ``{"type": "batch", "messages": [...]}`` frame (understood by
+        the Runyx hub). Returns one ``{"ok": bool, "error": str | None}`` per
+        message, in input order.
+        """
+        messages = list(messages)
+        results = [None] * len(messages)
+        batch_frames = max(1, int(batch_frames))
+        concurrency = max(1, int(concurrency))
+        pool = self._pool(endpoint)
+        pool.ensure(concurrency)
+
+        frames = asyncio.Queue()
+        for start in range(0, len(messages), batch_frames):
+            frames.put_nowait(range(start, min(start + batch_frames, len(messages))))
+
+        async def worker(slot):
+            while not frames.empty():
+                indexes = frames.get_nowait()
+                error = None
+                try:
+                    frame = _build_frame([messages[i] for i in indexes])
+                    attempt = 0
+                    while True:
+                        _, ws = await pool.acquire(slot)
+                        try:
+                            await ws.send(frame)
+                            break
+                        except websockets.ConnectionClosed:
+                            pool.discard(slot, ws)
+                            attempt += 1
+                            if attempt > self.retries:
+                                raise
+                except Exception as exc:
+                    error = str(exc) or exc.__class__.__name__
+                for i in indexes:
+                    results[i] = {"ok": error is None, "error": error}
+
+        await asyncio.gather(*(worker(slot) for slot in range(concurrency)))
+        return results
+
+    def _get_loop(self):
+        """Start (once) and return the background loop used by ``send``."""
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=loop.run_forever,
+                    name="runyx-ws-sender",
+                    daemon=True,
+                )
+                self._thread.start()
+                self._loop = loop
+        return self._loop
+
+    def _run(self, coro, timeout=None):
+        """Run a coroutine on the background loop and wait for its result."""
+        future = asyncio.run_coroutine_threadsafe(coro, self._get_loop())
+        return future.result(timeout)
+
+    def send(self, endpoint, message, timeout=None):
+        """Blocking variant of ``send_async``."""
+        return self._run(self.send_async(endpoint, message), timeout)
+
+    def send_many(self, endpoint, messages, concurrency=4, batch_frames=1, timeout=None):
+        """Blocking variant of ``send_many_async``."""
+        coro = self.send_many_async(endpoint, messages, concurrency, batch_frames)
+        return self._run(coro, timeout)
+
+    async def aclose(self):
+        """Close the pools that belong to the running event loop."""
+        loop = asyncio.get_running_loop()
+        for key in [k for k in self._pools if k[1] is loop]:
+            await self._pools.pop(key).close()
+
+    def close(self, timeout=5):
+        """Close pooled connections and stop the background loop."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.aclose(), loop).result(timeout)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(timeout)
+        loop.close()
+
+
+_DEFAULT_SENDER = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def get_sender():
+    """Return the process-wide Sender used by ``send``."""
+    global _DEFAULT_SENDER
+    with _DEFAULT_LOCK:
+        if _DEFAULT_SENDER is None:
+            _DEFAULT_SENDER = Sender()
+            atexit.register(_DEFAULT_SENDER.close)
+    return _DEFAULT_SENDER
 
 
 def send(endpoint, message):
-    """Public helper that runs the async sender."""
-    asyncio.run(_send(endpoint, message))
+    """Public helper that sends through the shared pooled Sender."""
+    get_sender().send(endpoint, message)
     print(f"[WS-SENDER] sent: {message} -> {endpoint}")
+
+
+def send_many(endpoint, messages, concurrency=4, batch_frames=1):
+    """Send many messages through the shared Sender; return per-message results."""
+    results = get_sender().send_many(endpoint, messages, concurrency, batch_frames)
+    failed = sum(1 for r in results if not r["ok"])
+    print(f"[WS-SENDER] sent: {len(results) - failed}/{len(results)} -> {endpoint}")
+    return results
@@ -1,12 +1,21 @@
-"""Minimal WebSocket trigger server."""
+"""WebSocket trigger hub with channel-based fan-out."""
 
+import json
 import asyncio
 import socket
+from urllib.parse import urlsplit, parse_qs
 import websockets
 from colorama import Fore, init
+from . import metrics, profiling
 
 init(autoreset=True)
 
+# messages buffered per client before the slow-consumer policy applies
+SEND_QUEUE_SIZE = 256
+SLOW_CONSUMER_POLICIES = ("drop", "disconnect")
+
+_HUB = None
+
 
 def _get_local_ip():
     """Return a best-effort LAN IP for display."""
@@ -20,20 +29,292 @@ def _get_local_ip():
         return "127.0.0.1"
 
 
-async def ws_handler(websocket):
-    """Echo incoming trigger events to the console."""
-    print(Fore.BLUE + "[WS] client connected")
+def _parse_message(message):
+    """Return the decoded JSON object of a message, or None."""
+    if isinstance(message, bytes):
+        try:
+            message = message.decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+    if not message.startswith("{"):
+        return None
     try:
-        async for message in websocket:
-            print(Fore.WHITE + f"[WS] trigger received: {message}")
-    except Exception:
-        pass
-    finally:
-        print(Fore.BLUE + "[WS] client disconnected")
+        data = json.loads(message)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _as_channels(value):
+    """Normalize a channel or list of channels into a set of names."""
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, (list, tuple)):
+        return set()
+    return {c.strip() for c in value if isinstance(c, str) and c.strip()}
+
+
+class _Client:
+    """A connected socket with its subscriptions and bounded send queue."""
+    def __init__(self, websocket, channels, publisher, queue_size):
+        self.websocket = websocket
+        self.id = str(getattr(websocket, "id", id(websocket)))
+        self.channels = channels
+        self.publisher = publisher
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def wants(self, channel):
+        """Return True when a message on ``channel`` should be delivered."""
+        if self.publisher:
+            return False
+        return channel is None or not self.channels or channel in self.channels
+
+    async def writer(self):
+        """Drain the send queue into the socket."""
+        while True:
+            message = await self.queue.get()
+            await self.websocket.send(message)
+
+
+class Hub:
+    """
+    Fan trigger messages out to connected clients by channel.
+
+    Subscriptions:
+      - ``?channel=a&channel=b`` (or ``?channels=a,b``) on the connection URL
+      - ``{"type": "subscribe" | "unsubscribe", "channel": "a"}`` messages
+      - clients without subscriptions receive every message
+      - ``?role=publisher`` connections only send and never receive
+
+    Any other message is a trigger: it is routed by its JSON ``channel``
+    field (messages without a channel go to everyone) and never echoed back
+    to the sender. ``{"type": "batch", "messages": [...]}`` frames are
+    unpacked and each message is handled as if it arrived on its own.
+
+    Each client has its own bounded queue drained by its own task, so a
+    slow client cannot stall the others. When a queue is full the
+    ``slow_consumer`` policy either drops the message for that client or
+    disconnects it.
+
+    Metrics are labelled with ``channels`` and with channels some client
+    subscribed to; every other channel is counted as ``"other"`` so that
+    clients cannot create unbounded label series.
+    """
+    def __init__(self, queue_size=SEND_QUEUE_SIZE, slow_consumer="drop", channels=()):
+        if slow_consumer not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"slow_consumer must be one of {SLOW_CONSUMER_POLICIES}")
+        self.queue_size = queue_size
+        self.slow_consumer = slow_consumer
+        self.channels = _as_channels(list(channels))
+        self.clients = {}
+        self.loop = None
+
+    def publish(self, message, channel=None, origin=None):
+        """Queue a message for every matching client; return the delivery count."""
+        delivered = 0
+        for client in list(self.clients.values()):
+            if client is origin or not client.wants(channel):
+                continue
+            try:
+                client.queue.put_nowait(message)
+                delivered += 1
+            except asyncio.QueueFull:
+                self._on_slow_consumer(client)
+        if delivered:
+            metrics.inc("runyx_ws_messages_out_total", delivered, channel=self._label(channel))
+        return delivered
+
+    def push(self, client_id, message):
+        """Queue a message for one client; return True if it was queued."""
+        client = self.clients.get(str(client_id))
+        if client is None:
+            return False
+        try:
+            client.queue.put_nowait(message)
+            metrics.inc("runyx_ws_messages_out_total", channel="@direct")
+            return True
+        except asyncio.QueueFull:
+            self._on_slow_consumer(client)
+            return False
+
+    def _label(self, channel):
+        """Return the metric label for ``channel``: known channels or ``"other"``."""
+        if not channel:
+            return "*"
+        if channel in self.channels:
+            return channel
+        if any(channel in c.channels for c in list(self.clients.values())):
+            return channel
+        return "other"
+
+    def _on_slow_consumer(self, client):
+        """Apply the slow-consumer policy to a client with a full queue."""
+        client.dropped += 1
+        metrics.inc("runyx_ws_dropped_total")
+        if self.slow_consumer == "disconnect":
+            self.clients.pop(client.id, None)
+            asyncio.ensure_future(client.websocket.close(1013, "slow consumer"))
+            print(Fore.YELLOW + f"[WS] slow consumer disconnected: {client.id}")
+
+    def _dispatch(self, client, message):
+        """Route one incoming message: control, batch or trigger."""
+        data = _parse_message(message)
+        if data is not None and data.get("type") == "batch":
+            for item in data.get("messages") or []:
+                if isinstance(item, (dict, list)):
+                    item = json.dumps(item)
+                if isinstance(item, str):
+                    self._dispatch(client, item)
+            return
+        if data is not None and self._handle_control(client, data):
+            return
+        channel = data.get("channel") if data is not None else None
+        channel = channel.strip() if isinstance(channel, str) else ""
+        print(Fore.WHITE + f"[WS] trigger received: {message}")
+        metrics.inc("runyx_ws_messages_in_total", channel=self._label(channel))
+        self.publish(message, channel=channel or None, origin=client)
+
+    def _handle_control(self, client, data):
+        """Apply a subscribe/unsubscribe message; return True if it was one."""
+        kind = data.get("type")
+        if kind not in ("subscribe", "unsubscribe"):
+            return False
+        channels = _as_channels(data.get("channels", data.get("channel")))
+        if kind == "subscribe":
+            client.channels |= channels
+        else:
+            client.channels -= channels
+        return True
+
+    async def handle(self, websocket):
+        """
+        Serve one connection: register it, route its messages, clean up.
+
+        A send failure other than a disconnect ends the connection and is
+        re-raised to the caller.
+        """
+        request = getattr(websocket, "request", None)
+        path = getattr(request, "path", None) or getattr(websocket, "path", "") or ""
+        query = parse_qs(urlsplit(path).query)
+        channels = _as_channels(query.get("channel", []))
+        for value in query.get("channels", []):
+            channels |= _as_channels(value.split(","))
+        publisher = "publisher" in query.get("role", [])
+
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+        client = _Client(websocket, channels, publisher, self.queue_size)
+        self.clients[client.id] = client
+        reader = asyncio.ensure_future(self._read(client, websocket))
+        writer = asyncio.ensure_future(client.writer())
+        print(Fore.BLUE + "[WS] client connected")
+        try:
+            # whichever side stops first ends the connection
+            await asyncio.wait({reader, writer}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self.clients.pop(client.id, None)
+            reader.cancel()
+            writer.cancel()
+            await asyncio.wait({reader, writer})
+            print(Fore.BLUE + "[WS] client disconnected")
+        failure = None if writer.cancelled() else writer.exception()
+        if failure is not None and not isinstance(failure, (websockets.ConnectionClosed, OSError)):
+            raise failure
+
+    async def _read(self, client, websocket):
+        """Route incoming messages until the client goes away."""
+        try:
+            async for message in websocket:
+                self._dispatch(client, message)
+        except Exception:
+            pass
 
+    def gauges(self):
+        """Return connected-client and per-channel subscriber gauges."""
+        subscribers = {}
+        receivers = [c for c in list(self.clients.values()) if not c.publisher]
+        for client in receivers:
+            for channel in client.channels:
+                subscribers[channel] = subscribers.get(channel, 0) + 1
+        samples = [("runyx_ws_clients", {}, len(receivers))]
+        samples += [("runyx_ws_subscribers", {"channel": c}, n) for c, n in subscribers.items()]
+        return samples
 
-async def _run_ws(host, port):
-    """Start the WebSocket server and block forever."""
+
+def get_hub():
+    """Return this process' hub, creating it with defaults if needed."""
+    global _HUB
+    if _HUB is None:
+        _HUB = Hub()
+    return _HUB
+
+
+def set_hub(hub):
+    """Install ``hub`` as this process' hub."""
+    global _HUB
+    _HUB = hub
+    return hub
+
+
+def _hub_gauges():
+    """Report the running hub's client and subscriber gauges, if any."""
+    return _HUB.gauges() if _HUB is not None else []
+
+
+metrics.register_gauge(_hub_gauges)
+
+
+def _call_on_hub(method, *args):
+    """Call a hub method on the hub's loop, from any thread."""
+    hub = _HUB
+    if hub is None or hub.loop is None:
+        raise RuntimeError(
+            "[WS] no WebSocket hub is running in this process; "
+            "use Bridge(mode='unified') to push from HTTP handlers"
+        )
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is hub.loop:
+        return getattr(hub, method)(*args)
+
+    async def _call():
+        return getattr(hub, method)(*args)
+
+    return asyncio.run_coroutine_threadsafe(_call(), hub.loop).result()
+
+
+def broadcast(message, channel=None):
+    """Queue a trigger for every matching client of the in-process hub."""
+    return _call_on_hub("publish", message, channel)
+
+
+def push(client_id, message):
+    """Queue a message for one client of the in-process hub."""
+    return _call_on_hub("push", client_id, message)
+
+
+def clients():
+    """Return ``{"id", "channels"}`` for each client of the in-process hub."""
+    hub = _HUB
+    if hub is None:
+        return []
+    return [
+        {"id": c.id, "channels": sorted(c.channels)}
+        for c in list(hub.clients.values())
+        if not c.publisher
+    ]
+
+
+async def ws_handler(websocket):
+    """Serve a connection on the process-wide hub."""
+    await get_hub().handle(websocket)
+
+
+def _print_banner(port):
+    """Print the WebSocket connection banner."""
     real_ip = _get_local_ip()
 
     print()
@@ -43,13 +324,30 @@ async def _run_ws(host, port):
     print(Fore.MAGENTA + f"[WS] Ngrok:    ngrok http {port}   (use wss://)")
     print()
 
+
+async def _run_ws(host, port, profile_dir=None):
+    """Start the WebSocket server and block forever."""
+    _print_banner(port)
+    get_hub().loop = asyncio.get_running_loop()
+    profiling.register_loop(get_hub().loop)
+    profiling.configure(profile_dir)
+
     async with websockets.serve(ws_handler, host, port):
         await asyncio.Future()
 
 
-def start_ws_server(host, port):
+def start_ws_server(
+    host,
+    port,
+    queue_size=SEND_QUEUE_SIZE,
+    slow_consumer="drop",
+    metrics_dir=None,
+    profile_dir=None,
+):
     """Entry point for the WS server process."""
+    metrics.configure(metrics_dir)
+    set_hub(Hub(queue_size=queue_size, slow_consumer=slow_consumer))
     try:
-        asyncio.run(_run_ws(host, port))
+        asyncio.run(_run_ws(host, port, profile_dir))
     except (KeyboardInterrupt, asyncio.CancelledError):
         print(Fore.YELLOW + "[WS] stopping...")
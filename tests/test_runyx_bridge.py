@@ -1,9 +1,40 @@
-﻿import pytest
+﻿import io
+import gzip
+import zlib
+import os
+import json
+import time
+import base64
+import decimal
+import datetime
+import hashlib
+import socket
+import pstats
+import tempfile
+import threading
+import asyncio
+import http.client
+
+import pytest
+import websockets
 from flask import Flask
 
-from runyx_bridge.decorators import receive, register_routes
+from runyx_bridge.decorators import receive, register_routes, _ROUTES
+from runyx_bridge.images import receive_image
+from runyx_bridge.run_ingest import receive_runs
+from runyx_bridge.artifacts import ArtifactStore
+from runyx_bridge.history import RunHistory, extract, merge
+from runyx_bridge.handler_pool import queue_stats
+from runyx_bridge import codec, compression, metrics, profiling, profile_template, project_file
+from runyx_bridge.http_server import create_app
 from runyx_bridge.bridge import Bridge
 from runyx_bridge.app import RunyxApp
+from runyx_bridge.browser import BrowserSession, extension_id_for
+from runyx_bridge.browser_pool import BrowserPool
+from runyx_bridge.extension import ExtensionActivator
+from runyx_bridge.asgi import create_asgi_app
+from runyx_bridge.websocket_server import Hub, _Client, set_hub, broadcast, push
+from runyx_bridge.websocket_sender import Sender, _Pool
 
 
 def make_test_app():
@@ -35,6 +66,41 @@ def handle_cookies(payload, meta):
     return payload
 
 
+@receive("/stream", stream=True, spool_threshold=16)
+def handle_stream(payload, meta):
+    size = 0
+    for chunk in iter(lambda: payload.read(4), b""):
+        size += len(chunk)
+    return {"size": size, "onDisk": payload._rolled}
+
+
+@receive("/meta")
+def handle_meta(payload, meta):
+    resolved_before = sorted(dict.keys(meta))
+    body = meta["body"]
+    meta["extra"] = 1
+    return {
+        "resolvedBefore": resolved_before,
+        "bodyType": type(body).__name__,
+        "bodyLen": len(body),
+        "query": meta["query"],
+        "keys": sorted(meta),
+        "hasHeaders": "headers" in meta and meta.get("headers")["X-Test"] == "1",
+        "json": json.loads(json.dumps(meta))["method"],
+    }
+
+
+@receive("/meta-echo")
+def handle_meta_echo(payload, meta):
+    return meta
+
+
+@receive("/async")
+async def handle_async(payload, meta):
+    await asyncio.sleep(0)
+    return {"echo": payload, "method": meta.get("method")}
+
+
 def test_receive_route_json_ok():
     app = make_test_app()
     client = app.test_client()
@@ -154,3 +220,1046 @@ def test_runyxapp_start_calls_components(monkeypatch):
     assert calls["browser_stop"] == 1
     assert calls["bridge_stop"] == 1
 
+
+def _free_port():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def test_bridge_prefork_workers_share_socket_with_keep_alive():
+    port = _free_port()
+    b = Bridge(host="127.0.0.1", http_port=port, websocket=False, on_background=True, http_workers=2)
+    processes = b.start()
+    try:
+        assert len(processes) == 2
+
+        deadline = time.time() + 20
+        while True:
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+                conn.request("GET", "/missing")
+                resp = conn.getresponse()
+                resp.read()
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.2)
+
+        assert resp.status == 404
+        assert resp.version == 11
+        assert resp.getheader("Connection", "").lower() != "close"
+        sock = conn.sock
+
+        # same connection is reused, even after a body the app never read
+        for method, body in (("POST", b"x" * 200000), ("GET", None), ("POST", b"{}")):
+            conn.request(method, "/missing", body)
+            resp = conn.getresponse()
+            resp.read()
+            assert resp.status == 404
+            assert resp.getheader("Connection", "").lower() != "close"
+            assert conn.sock is sock
+        conn.close()
+    finally:
+        b.stop()
+
+
+def test_async_handler_on_flask_view():
+    app = make_test_app()
+    client = app.test_client()
+
+    resp = client.post("/async", json={"a": 1})
+    assert resp.status_code == 200
+    assert resp.get_json()["result"] == {"echo": {"a": 1}, "method": "POST"}
+
+
+def call_asgi(app, method, path, body=b"", headers=None):
+    messages = []
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "path": path,
+        "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": ("127.0.0.1", 5555),
+        "server": ("127.0.0.1", 5001),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = messages[0]
+    data = b"".join(m.get("body", b"") for m in messages[1:])
+    return start["status"], dict(start["headers"]), data
+
+
+def test_asgi_app_runs_async_and_sync_handlers():
+    app = create_asgi_app()
+
+    status, headers, data = call_asgi(
+        app, "POST", "/async", b'{"a": 1}', {"Content-Type": "application/json"}
+    )
+    assert status == 200
+    assert headers[b"access-control-allow-origin"] == b"*"
+    assert json.loads(data)["result"] == {"echo": {"a": 1}, "method": "POST"}
+
+    status, _, data = call_asgi(app, "POST", "/receive", b"raw", {"Content-Type": "text/plain"})
+    assert status == 200
+    assert json.loads(data)["result"]["payloadType"] == "bytes"
+
+    status, _, _ = call_asgi(app, "OPTIONS", "/receive")
+    assert status == 204
+
+    status, _, _ = call_asgi(app, "POST", "/missing")
+    assert status == 404
+
+
+def test_asgi_truncated_body_never_reaches_handler(monkeypatch):
+    calls = []
+    spools = []
+
+    @receive("/truncated")
+    def truncated(payload, meta):
+        calls.append(payload)
+        return "ok"
+
+    class Spool(tempfile.SpooledTemporaryFile):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            spools.append(self)
+
+    monkeypatch.setattr("runyx_bridge.asgi.tempfile.SpooledTemporaryFile", Spool)
+    messages = iter([
+        {"type": "http.request", "body": b'{"a"', "more_body": True},
+        {"type": "http.disconnect"},
+    ])
+    sent = []
+
+    async def receive_message():
+        return next(messages)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/truncated",
+             "headers": [(b"content-type", b"application/json"), (b"content-length", b"1000")]}
+    asyncio.run(create_asgi_app()(scope, receive_message, send))
+    assert calls == [] and sent == []
+    assert len(spools) == 1 and spools[0].closed
+
+
+def test_stream_route_spools_large_bodies():
+    app = make_test_app()
+    client = app.test_client()
+
+    resp = client.post("/stream", data=b"x" * 8)
+    assert resp.get_json()["result"] == {"size": 8, "onDisk": False}
+
+    resp = client.post("/stream", data=b"x" * 4096)
+    assert resp.get_json()["result"] == {"size": 4096, "onDisk": True}
+
+    status, _, data = call_asgi(create_asgi_app(), "POST", "/stream", b"y" * 4096)
+    assert status == 200
+    assert json.loads(data)["result"] == {"size": 4096, "onDisk": True}
+
+
+def test_stream_route_closes_spool_of_undecodable_body(monkeypatch):
+    spools = []
+
+    class Spool(tempfile.SpooledTemporaryFile):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            spools.append(self)
+
+    monkeypatch.setattr("runyx_bridge.decorators.tempfile.SpooledTemporaryFile", Spool)
+    corrupt = b"not gzip at all" * 300
+    resp = make_test_app().test_client().post("/stream", data=corrupt, headers={"Content-Encoding": "gzip"})
+    assert resp.status_code == 400
+    assert spools and all(spool.closed for spool in spools)
+
+
+def test_ws_hub_routes_by_channel():
+    async def scenario():
+        hub = Hub()
+        async with websockets.serve(hub.handle, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            url = f"ws://127.0.0.1:{port}"
+            async with websockets.connect(url + "/?channel=a") as sub_a, \
+                    websockets.connect(url) as sub_b, \
+                    websockets.connect(url + "/?role=publisher") as pub:
+                await sub_b.send(json.dumps({"type": "subscribe", "channel": "b"}))
+                while len(hub.clients) < 3 or not any(c.channels == {"b"} for c in hub.clients.values()):
+                    await asyncio.sleep(0.01)
+
+                await pub.send(json.dumps({"event": "go", "channel": "b"}))
+                await pub.send("plain")
+
+                assert json.loads(await sub_b.recv())["channel"] == "b"
+                assert await sub_b.recv() == "plain"
+                assert await sub_a.recv() == "plain"
+
+    asyncio.run(scenario())
+
+
+def test_ws_hub_slow_consumer_policies():
+    class StuckSocket:
+        closed_with = None
+
+        async def send(self, message):
+            await asyncio.Future()
+
+        async def close(self, code, reason):
+            self.closed_with = code
+
+    async def scenario(policy):
+        hub = Hub(queue_size=2, slow_consumer=policy)
+        sock = StuckSocket()
+        client = _Client(sock, set(), False, hub.queue_size)
+        hub.clients[client.id] = client
+
+        delivered = [hub.publish(f"m{i}") for i in range(4)]
+        await asyncio.sleep(0)
+        return hub, client, sock, delivered
+
+    hub, client, sock, delivered = asyncio.run(scenario("drop"))
+    assert delivered == [1, 1, 0, 0]
+    assert client.dropped == 2
+    assert client.id in hub.clients
+
+    hub, client, sock, delivered = asyncio.run(scenario("disconnect"))
+    assert client.id not in hub.clients
+    assert sock.closed_with == 1013
+
+
+def test_ws_hub_writer_failure_ends_connection():
+    class BrokenSocket:
+        path = "/"
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            await asyncio.Future()
+
+        async def send(self, message):
+            raise ValueError("cannot send")
+
+    async def scenario():
+        hub = Hub()
+        handling = asyncio.ensure_future(hub.handle(BrokenSocket()))
+        while not hub.clients:
+            await asyncio.sleep(0.01)
+        hub.publish("boom")
+        with pytest.raises(ValueError):
+            await asyncio.wait_for(handling, 5)
+        assert hub.clients == {}
+
+    asyncio.run(scenario())
+
+
+def test_sender_reuses_and_reopens_connections():
+    async def scenario():
+        received, connections = [], []
+
+        async def handler(ws):
+            connections.append(ws)
+            async for message in ws:
+                received.append(message)
+
+        async with websockets.serve(handler, "127.0.0.1", 0) as server:
+            url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+            sender = Sender()
+
+            for i in range(20):
+                await sender.send_async(url, f"a{i}")
+            # blocking API runs on the sender's own loop (one more connection)
+            await asyncio.to_thread(lambda: [sender.send(url, f"s{i}") for i in range(5)])
+            while len(received) < 25:
+                await asyncio.sleep(0.01)
+            assert len(connections) == 2
+
+            await connections[0].close()
+            await sender.send_async(url, "after-close")
+            while len(received) < 26:
+                await asyncio.sleep(0.01)
+            assert len(connections) == 3
+            assert received[-1] == "after-close"
+
+            await sender.aclose()
+            await asyncio.to_thread(sender.close)
+
+    asyncio.run(scenario())
+
+    # each asyncio.run() gets a new loop; pools of closed loops are dropped
+    sender = Sender()
+
+    async def get_pool():
+        return sender._pool("ws://127.0.0.1:1")
+
+    first, second = asyncio.run(get_pool()), asyncio.run(get_pool())
+    assert first is not second and list(sender._pools.values()) == [second]
+
+    grown = _Pool("ws://127.0.0.1:1", 1, {})
+    grown.ensure(3)
+    assert [next(grown._slots) for _ in range(4)] == [0, 1, 2, 0]
+
+
+def test_send_many_batches_through_hub():
+    async def scenario():
+        hub = Hub()
+        async with websockets.serve(hub.handle, "127.0.0.1", 0) as server:
+            url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+            async with websockets.connect(url) as sub:
+                while len(hub.clients) < 1:
+                    await asyncio.sleep(0.01)
+                sender = Sender()
+                messages = [json.dumps({"event": "go", "n": i}) for i in range(50)]
+                results = await sender.send_many_async(url, messages, concurrency=3, batch_frames=8)
+
+                assert len(results) == 50
+                assert all(r["ok"] for r in results)
+                got = sorted([json.loads(await sub.recv())["n"] for _ in range(50)])
+                assert got == list(range(50))
+                await sender.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_pooled_sender_receives_no_broadcasts():
+    async def scenario():
+        hub = Hub()
+        async with websockets.serve(hub.handle, "127.0.0.1", 0) as server:
+            url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+            sender = Sender()
+            await sender.send_async(url, "hello")
+            while len(hub.clients) < 1:
+                await asyncio.sleep(0.01)
+            assert all(c.publisher for c in hub.clients.values())
+            assert hub.publish("broadcast") == 0
+            await sender.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_ws_hub_labels_only_known_channels():
+    class Sink:
+        async def send(self, message):
+            pass
+
+    async def scenario():
+        hub = Hub(channels=["builds"])
+        sub = _Client(Sink(), {"alerts"}, False, 8)
+        pub = _Client(Sink(), set(), True, 8)
+        hub.clients = {sub.id: sub, pub.id: pub}
+        for channel in ("builds", "alerts", "spam-1", "spam-2"):
+            hub._dispatch(pub, json.dumps({"channel": channel}))
+
+    asyncio.run(scenario())
+    labels = {
+        labels["channel"]
+        for name, labels, _ in metrics.snapshot()["counters"]
+        if name == "runyx_ws_messages_in_total"
+    }
+    assert {"builds", "alerts", "other"} <= labels
+    assert not {"spam-1", "spam-2"} & labels
+
+
+def test_broadcast_and_push_use_in_process_hub():
+    with pytest.raises(RuntimeError):
+        broadcast("nobody")
+
+    class Sink:
+        async def send(self, message):
+            pass
+
+    async def scenario():
+        hub = set_hub(Hub())
+        hub.loop = asyncio.get_running_loop()
+        a = _Client(Sink(), {"a"}, False, 8)
+        b = _Client(Sink(), set(), False, 8)
+        hub.clients = {a.id: a, b.id: b}
+
+        # sync handlers call from executor threads, async ones from the loop
+        assert await asyncio.to_thread(broadcast, "to-a", "a") == 2
+        assert broadcast("to-b", "b") == 1
+        assert await asyncio.to_thread(push, b.id, "direct") is True
+        assert push("unknown", "direct") is False
+        return a.queue.qsize(), b.queue.qsize()
+
+    try:
+        assert asyncio.run(scenario()) == (1, 3)
+    finally:
+        set_hub(None)
+
+
+def test_msgpack_request_and_negotiated_response():
+    msgpack = pytest.importorskip("msgpack")
+    app = make_test_app()
+    client = app.test_client()
+
+    body = msgpack.packb([{"name": "a", "value": "1"}])
+    resp = client.post(
+        "/cookies",
+        data=body,
+        headers={"Content-Type": "application/msgpack", "Accept": "application/msgpack"},
+    )
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/msgpack"
+    assert msgpack.unpackb(resp.data) == {"ok": True, "result": [{"name": "a", "value": "1"}]}
+
+    # default negotiation stays JSON
+    resp = client.post("/cookies", data=body, headers={"Content-Type": "application/msgpack", "Accept": "*/*"})
+    assert resp.mimetype == "application/json"
+    assert resp.get_json()["result"] == [{"name": "a", "value": "1"}]
+
+
+def test_json_codec_matches_flask_provider(monkeypatch):
+    value = {"b": datetime.datetime(2024, 1, 1, 12, 30), "a": [decimal.Decimal("1.5"), datetime.date(2024, 1, 2)]}
+    expected = json.loads(Flask(__name__).json.dumps(value))
+
+    assert json.loads(codec.json_dumps(value)) == expected
+    assert list(json.loads(codec.json_dumps(value))) == ["a", "b"]
+    monkeypatch.setattr(codec, "orjson", None)
+    assert codec.json_dumps(value) == json.dumps(expected, separators=(",", ":")).encode()
+
+
+def test_request_meta_is_lazy_and_dict_compatible():
+    app = make_test_app()
+    client = app.test_client()
+
+    resp = client.post("/meta?page=2", data=b"abcdef", headers={"X-Test": "1"})
+    result = resp.get_json()["result"]
+    assert result["resolvedBefore"] == ["method", "path"]
+    assert result["bodyType"] == "memoryview"
+    assert result["bodyLen"] == 6
+    assert result["query"] == {"page": "2"}
+    assert result["hasHeaders"] is True
+    assert result["keys"] == sorted(
+        ["headers", "method", "path", "remote_addr", "content_type", "query", "extra"]
+    )
+    assert result["json"] == "POST"
+
+    echoed = client.post("/meta-echo?page=2", data=b"abc").get_json()["result"]
+    assert echoed["query"] == {"page": "2"} and echoed["method"] == "POST" and "body" not in echoed
+
+
+def test_receive_image_acknowledges_then_writes_in_background(tmp_path):
+    saved = []
+
+    @receive_image("/shot", out_dir=str(tmp_path))
+    def on_saved(path, info):
+        saved.append(info)
+
+    writer = _ROUTES[-1]["handler"].writer
+    app = make_test_app()
+    client = app.test_client()
+    png = b"\x89PNG\r\n\x1a\nfake"
+    b64 = base64.b64encode(png).decode()
+
+    resp = client.post("/shot", json={"screenshot": f"data:image/jpeg;base64,{b64}", "fileName": "../a b"})
+    assert resp.get_json()["result"]["queued"] is True
+    client.post("/shot", data={"file": (io.BytesIO(png), "page.png")}, content_type="multipart/form-data")
+    client.post("/shot", data=png, headers={"Content-Type": "image/png"})
+    client.post("/shot", data=b64, headers={"Content-Type": "text/plain"})
+    writer.join()
+
+    assert len(saved) == 4
+    assert all(open(info["file"], "rb").read() == png for info in saved)
+    names = sorted(os.path.basename(info["file"]) for info in saved)
+    assert "a_b.jpg" in names and "page.png" in names
+    assert sum(n.startswith("screenshot_") and n.endswith(".png") for n in names) == 2
+
+    again = client.post("/shot", data={"file": (io.BytesIO(b"second"), "page.png")}, content_type="multipart/form-data")
+    writer.join()
+    assert saved[-1]["file"].endswith(f"page_{again.get_json()['result']['id']}.png")
+    assert open(tmp_path / "page.png", "rb").read() == png
+
+
+def test_artifact_store_deduplicates_identical_uploads(tmp_path):
+    store = ArtifactStore(str(tmp_path / "artifacts"))
+
+    @receive("/artifact", raw=True)
+    def artifact(payload, meta):
+        return store.put(payload, meta)
+
+    client = make_test_app().test_client()
+    first = client.post("/artifact?runId=r1&workflowId=w1", data=b"<html>same</html>").get_json()["result"]
+    second = client.post("/artifact?runId=r2&workflowId=w1", data=b"<html>same</html>").get_json()["result"]
+    streamed = store.put(io.BytesIO(b"<html>same</html>"), run_id="r3")
+
+    assert first["new"] is True and second["new"] is False and streamed["new"] is False
+    assert first["digest"] == second["digest"] == streamed["digest"]
+    with store.open(first["digest"]) as f:
+        assert f.read() == b"<html>same</html>"
+    assert [r["run_id"] for r in store.refs(workflow_id="w1")] == ["r2", "r1"]
+    assert store.stats()["blobs"] == 1 and store.stats()["refs"] == 3
+    assert os.listdir(os.path.dirname(store.path(first["digest"]))) == [first["digest"]]
+    store.close()
+
+
+def test_compressed_request_bodies_and_responses(monkeypatch):
+    client = make_test_app().test_client()
+    html = {"html": "<div>" * 2000}
+    raw = json.dumps(html).encode()
+
+    resp = client.post("/cookies", data=gzip.compress(raw), headers={
+        "Content-Type": "application/json",
+        "Content-Encoding": "gzip",
+        "Accept-Encoding": "gzip",
+    })
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert json.loads(gzip.decompress(resp.data))["result"] == html
+
+    resp = client.post("/stream", data=zlib.compress(b"x" * 100), headers={"Content-Encoding": "deflate"})
+    assert resp.get_json()["result"] == {"size": 100, "onDisk": True}
+
+    assert client.post("/cookies", data=b"x", headers={"Content-Encoding": "lzma"}).status_code == 415
+    assert client.post("/cookies", data=b"nope", headers={"Content-Encoding": "gzip"}).status_code == 400
+
+    status, headers, data = call_asgi(create_asgi_app(), "POST", "/stream", gzip.compress(b"y" * 50), {
+        "Content-Encoding": "gzip",
+    })
+    assert status == 200 and json.loads(data)["result"]["size"] == 50
+
+    # output is decoded in bounded steps, whatever the compression ratio
+    big = b"z" * (3 * 1024 * 1024)
+    encoded = {"gzip": gzip.compress(big)}
+    for name, module in (("br", "brotli"), ("zstd", "zstandard")):
+        if name in compression._DECODERS:
+            lib = pytest.importorskip(module)
+            encoded[name] = lib.compress(big) if name == "br" else lib.ZstdCompressor().compress(big) * 2
+    for name, body in encoded.items():
+        reader = compression._DECODERS[name](io.BytesIO(body))
+        sizes, buf = [], bytearray(1024 * 1024)
+        while n := reader.readinto(buf):
+            sizes.append(n)
+        assert sum(sizes) == len(big) * (2 if name == "zstd" else 1) and max(sizes) <= 128 * 1024
+
+    monkeypatch.setattr(compression, "MAX_DECODED_SIZE", 1024 * 1024)
+    bomb = gzip.compress(b"\0" * (2 * 1024 * 1024))
+    headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    assert client.post("/cookies", data=bomb, headers=headers).status_code == 413
+    assert call_asgi(create_asgi_app(), "POST", "/cookies", bomb, headers)[0] == 413
+
+
+def test_route_pool_rejects_with_429_and_expires_with_503():
+    release = threading.Event()
+    started = threading.Event()
+
+    @receive("/busy", workers=1, queue_size=1, queue_timeout=0.05, retry_after=7)
+    def busy(payload, meta):
+        started.set()
+        release.wait(5)
+        return "done"
+
+    app = make_test_app()
+    results = {}
+
+    def post(name):
+        results[name] = app.test_client().post("/busy", json={})
+
+    first = threading.Thread(target=post, args=("first",))
+    first.start()
+    started.wait(5)
+    queued = threading.Thread(target=post, args=("queued",))
+    queued.start()
+    time.sleep(0.1)
+
+    rejected = app.test_client().post("/busy", json={})
+    assert rejected.status_code == 429 and rejected.headers["Retry-After"] == "7"
+    assert queue_stats()["/busy"]["queued"] == 1
+
+    release.set()
+    first.join()
+    queued.join()
+    assert results["first"].get_json()["result"] == "done"
+    assert results["queued"].status_code == 503
+    stats = queue_stats()["/busy"]
+    assert stats["in_flight"] == 0 and stats["rejected"] == 1 and stats["expired"] == 1
+
+    # on the ASGI path a client dropping mid-body gives its slot back
+    async def broken_receive():
+        raise ConnectionResetError("client went away")
+
+    async def ignore(message):
+        pass
+
+    scope = {"type": "http", "method": "POST", "path": "/busy", "headers": []}
+    for _ in range(3):
+        asyncio.run(create_asgi_app()(scope, broken_receive, ignore))
+    assert queue_stats()["/busy"]["in_flight"] == 0
+
+    # pools are opt-in and never hold coroutine handlers
+    assert "/cookies" not in queue_stats()
+    with pytest.raises(ValueError):
+        receive("/async-pooled", workers=2)(handle_async)
+
+
+def test_metrics_endpoint_aggregates_process_snapshots(tmp_path):
+    metrics.configure(str(tmp_path))
+    other = {
+        "pid": -1,
+        "time": time.time(),
+        "counters": [["runyx_ws_messages_in_total", {"channel": "jobs"}, 5]],
+        "histograms": [],
+        "gauges": [["runyx_ws_clients", {}, 3]],
+    }
+    (tmp_path / "-1.json").write_text(json.dumps(other))
+
+    @receive("/metered")
+    def metered(payload, meta):
+        return payload
+
+    client = create_app(metrics_endpoint=True).test_client()
+    client.post("/metered", json={"a": 1})
+    client.post("/metered", json={"a": 2})
+    text = client.get("/metrics").get_data(as_text=True)
+
+    assert 'runyx_http_requests_total{method="POST",route="/metered",status="200"} 2' in text
+    assert 'runyx_http_request_duration_seconds_count{route="/metered"} 2' in text
+    assert 'runyx_http_request_body_bytes_bucket{route="/metered",le="+Inf"} 2' in text
+    assert 'runyx_ws_messages_in_total{channel="jobs"} 5' in text
+    assert "runyx_ws_clients 3" in text
+
+    other["time"] -= 60
+    (tmp_path / "-1.json").write_text(json.dumps(other))
+    text = client.get("/metrics").get_data(as_text=True)
+    assert "runyx_ws_clients 3" not in text
+    assert 'runyx_ws_messages_in_total{channel="jobs"} 5' in text
+    metrics._STATE["dir"] = None
+
+
+def test_profiling_sessions_capture_route_handlers(tmp_path):
+    def spin():
+        deadline = time.time() + 0.05
+        while time.time() < deadline:
+            pass
+
+    @receive("/profiled")
+    def profiled(payload, meta):
+        spin()
+        return "ok"
+
+    client = make_test_app().test_client()
+
+    sampled = profiling.start("/profiled", mode="sample", seconds=60, interval=0.001, out_dir=str(tmp_path))
+    for _ in range(3):
+        client.post("/profiled", json={})
+    folded = sampled.stop()
+    assert folded.endswith(".folded")
+    stacks = open(folded).read().splitlines()
+    assert stacks and any("spin (test_runyx_bridge.py" in line for line in stacks)
+
+    profiled_run = profiling.start("/profiled", mode="cprofile", seconds=60, out_dir=str(tmp_path))
+    client.post("/profiled", json={})
+    stats = pstats.Stats(profiled_run.stop())
+    assert any(func[2] == "spin" for func in stats.stats)
+
+    @receive("/profiled-async")
+    async def profiled_async(payload, meta):
+        spin()
+        return "ok"
+
+    # coroutines are profiled on the loop they run on, not the waiting thread
+    sampled = profiling.start("/profiled-async", mode="sample", seconds=60, interval=0.001, out_dir=str(tmp_path))
+    for _ in range(3):
+        make_test_app().test_client().post("/profiled-async", json={})
+    stacks = open(sampled.stop()).read().splitlines()
+    assert any("spin (test_runyx_bridge.py" in line for line in stacks)
+
+    profiled_run = profiling.start("/profiled-async", mode="cprofile", seconds=60, out_dir=str(tmp_path))
+    assert call_asgi(create_asgi_app(), "POST", "/profiled-async", b"{}")[0] == 200
+    stats = pstats.Stats(profiled_run.stop())
+    assert any(func[2] == "spin" for func in stats.stats)
+
+
+def test_profile_endpoint_lists_nothing_before_any_session(tmp_path):
+    profile_dir = tmp_path / "profiles"
+    profiling.configure(str(profile_dir))
+    try:
+        resp = create_app(profile_endpoint=True).test_client().get(profiling.ADMIN_PATH)
+        assert resp.status_code == 200
+        assert resp.get_json()["result"]["profiles"] == []
+    finally:
+        profiling._STATE["dir"] = None
+
+
+def test_browser_pool_checkout_return_and_replacement():
+    class FakeSession:
+        def __init__(self, slot):
+            self.slot = slot
+            self.alive = False
+            self.stopped = False
+
+        def start(self):
+            self.alive = True
+            return "driver-%d" % self.slot
+
+        def is_alive(self):
+            return self.alive
+
+        def stop(self):
+            self.alive = False
+            self.stopped = True
+
+    created = []
+    prepared = []
+
+    def factory(slot):
+        session = FakeSession(slot)
+        created.append(session)
+        return session
+
+    pool = BrowserPool(factory, size=2, prepare=lambda s, d: prepared.append(d), check_interval=0.05)
+    pool.start()
+    try:
+        assert sorted(prepared) == ["driver-0", "driver-1"]
+        first = pool.checkout(timeout=1)
+        second = pool.checkout(timeout=1)
+        assert {first.slot, second.slot} == {0, 1}
+        with pytest.raises(TimeoutError):
+            pool.checkout(timeout=0.1)
+
+        # a browser returned dead is replaced in the background
+        first.alive = False
+        pool.release(first)
+        replacement = pool.checkout(timeout=2)
+        assert replacement is not first and replacement.slot == first.slot
+        assert len(created) == 3
+
+        # an idle browser that dies is replaced by the monitor
+        pool.release(second)
+        second.alive = False
+        deadline = time.time() + 2
+        while len(created) < 4 and time.time() < deadline:
+            time.sleep(0.02)
+        assert len(created) == 4
+        with pool.session(timeout=2) as browser:
+            assert browser.is_alive() and browser.slot == second.slot
+        # "replacement" is still checked out
+        assert pool.stats() == {"size": 2, "idle": 1, "in_use": 1}
+    finally:
+        pool.stop()
+    assert all(s.stopped for s in created)
+
+
+def test_browser_pool_probe_keeps_session_available():
+    probing = threading.Event()
+    gate = threading.Event()
+
+    class SlowProbeSession:
+        def start(self):
+            return "driver"
+
+        def is_alive(self):
+            if threading.current_thread().name == "runyx-browser-pool":
+                probing.set()
+                gate.wait(2)
+            return True
+
+        def stop(self):
+            pass
+
+    pool = BrowserPool(lambda slot: SlowProbeSession(), size=1, check_interval=0.01)
+    pool.start()
+    try:
+        assert probing.wait(2)
+        # the only browser is being probed, yet it is still idle and can be taken
+        assert pool.stats()["idle"] == 1
+        session = pool.checkout(timeout=0.2)
+        assert pool.stats() == {"size": 1, "idle": 0, "in_use": 1}
+        pool.release(session)
+    finally:
+        gate.set()
+        pool.stop()
+
+
+def test_profile_template_is_marked_and_cloned_without_locks(tmp_path):
+    ext = tmp_path / "extension"
+    ext.mkdir()
+    (ext / "manifest.json").write_text('{"name": "runyx"}')
+    project = tmp_path / "project.json"
+    project.write_text('{"project": {"id": "p"}, "workflows": []}')
+
+    template = tmp_path / "template"
+    (template / "Default" / "Cache").mkdir(parents=True)
+    (template / "Default" / "Cache" / "data_0").write_bytes(b"x" * 64)
+    (template / "Default" / "Preferences").write_text("{}")
+    (template / "SingletonLock").write_text("host-1")
+
+    expected = profile_template.fingerprint("chrome", str(ext), str(project))
+    assert not profile_template.is_ready(str(template), expected)
+    profile_template.finalize(str(template), expected)
+    assert profile_template.is_ready(str(template), expected)
+    assert not (template / "SingletonLock").exists()
+    assert not (template / "Default" / "Cache").exists()
+
+    dest = tmp_path / "session" / "profile"
+    assert profile_template.clone(str(template), str(dest)) in ("cp", "copy")
+    assert (dest / "Default" / "Preferences").read_text() == "{}"
+    assert not (dest / profile_template.MARKER).exists()
+
+    # a session's writes never reach the template
+    (dest / "Default" / "Preferences").write_text('{"changed": true}')
+    assert (template / "Default" / "Preferences").read_text() == "{}"
+
+    project.write_text('{"project": {"id": "p2"}, "workflows": []}')
+    changed = profile_template.fingerprint("chrome", str(ext), str(project))
+    assert not profile_template.is_ready(str(template), changed)
+
+
+def test_template_clones_skip_activation(tmp_path, monkeypatch):
+    ext = tmp_path / "extension"
+    ext.mkdir()
+    (ext / "manifest.json").write_text('{"name": "runyx"}')
+    app = RunyxApp(
+        browser="chrome",
+        extension_path=str(ext),
+        require_import=False,
+        user_data_dir=str(tmp_path / "profiles"),
+        profile_template=str(tmp_path / "template"),
+    )
+    activated = []
+    monkeypatch.setattr(app, "_activate_extension", lambda driver, ext_id, timings: activated.append(driver))
+    monkeypatch.setattr(app.activator, "wait_for_service_worker", lambda driver, ext_id, timeout: 0.01)
+
+    def session(user_data_dir):
+        return BrowserSession(extension_path=str(ext), user_data_dir=user_data_dir)
+
+    # the template build activates the extension, clones only check readiness
+    app._prepare_browser(session(app.profile_template), "template-driver")
+    timings = app._prepare_browser(session(str(tmp_path / "profiles" / "slot-0")), "clone-driver")
+    assert activated == ["template-driver"]
+    assert timings == {"service_worker": 0.01}
+
+
+def test_extension_id_is_computed_from_path_or_manifest_key(tmp_path):
+    ext = tmp_path / "ext"
+    ext.mkdir()
+    (ext / "manifest.json").write_text('{"manifest_version": 3, "name": "runyx"}')
+
+    digest = hashlib.sha256(os.path.realpath(str(ext)).encode("utf-8")).hexdigest()[:32]
+    expected = "".join(chr(ord("a") + int(c, 16)) for c in digest)
+    session = BrowserSession(extension_path=str(ext), user_data_dir=str(tmp_path / "profile"))
+    if os.name != "nt":
+        assert session.get_extension_id() == expected
+    # no Secure Preferences yet: unknown rather than "missing"
+    assert session.extension_loaded() is None
+
+    keyed = tmp_path / "keyed"
+    keyed.mkdir()
+    key = base64.b64encode(b"public-key-der").decode()
+    (keyed / "manifest.json").write_text(json.dumps({"name": "runyx", "key": key}))
+    key_id = extension_id_for(str(keyed))
+    assert key_id == "".join(
+        chr(ord("a") + int(c, 16)) for c in hashlib.sha256(b"public-key-der").hexdigest()[:32]
+    )
+    assert len(key_id) == 32 and set(key_id) <= set("abcdefghijklmnop")
+
+
+def test_browser_watch_reports_driver_exit_once(tmp_path):
+    import subprocess
+    import sys
+
+    class FakeService:
+        def __init__(self):
+            self.process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+
+    class FakeDriver:
+        current_window_handle = "x"
+        capabilities = {}
+
+        def __init__(self):
+            self.service = FakeService()
+
+    session = BrowserSession(user_data_dir=str(tmp_path))
+    session.driver = FakeDriver()
+    exited = []
+    assert session.watch(exited.append, poll_interval=0.05)
+    assert session.is_alive()
+
+    session.driver.service.process.kill()
+    deadline = time.time() + 5
+    while not exited and time.time() < deadline:
+        time.sleep(0.02)
+    assert exited == [session]
+    assert not session.is_alive()
+
+    # an intentional stop is not reported
+    session.driver = FakeDriver()
+    stopped = []
+    session.watch(stopped.append, poll_interval=0.05)
+    driver, session.driver = session.driver, None
+    driver.service.process.kill()
+    driver.service.process.wait()
+    time.sleep(0.2)
+    assert stopped == []
+
+
+def test_headless_session_uses_new_headless_without_maximize(monkeypatch, tmp_path):
+    captured = {}
+
+    def fake_chrome(service=None, options=None):
+        captured["args"] = list(options.arguments)
+        return "driver"
+
+    monkeypatch.setattr("runyx_bridge.browser.webdriver.Chrome", fake_chrome)
+    session = BrowserSession(browser="chrome", extension_path=str(tmp_path), headless=True)
+    assert session.start() == "driver"
+    assert "--headless=new" in captured["args"]
+    assert "--window-size=1920,1080" in captured["args"]
+    assert "--start-maximized" not in captured["args"]
+    assert f"--load-extension={tmp_path}" in captured["args"]
+
+    BrowserSession(browser="chrome").start()
+    assert "--start-maximized" in captured["args"] and "--headless=new" not in captured["args"]
+
+
+def test_activator_waits_on_readiness_signals():
+    class FakeDriver:
+        current_url = "chrome-extension://abc/ui.html"
+
+        def __init__(self):
+            self.polls = 0
+
+        def execute_cdp_cmd(self, cmd, params):
+            self.polls += 1
+            targets = [{"type": "page", "url": "about:blank"}]
+            if self.polls >= 3:
+                targets.append({"type": "service_worker", "url": "chrome-extension://abc/background.js"})
+            return {"targetInfos": targets}
+
+        def execute_script(self, script):
+            return "complete"
+
+        def execute_async_script(self, script, key):
+            assert key == "runyx:projects"
+            return "proj-1" if self.polls >= 3 else None
+
+    activator = ExtensionActivator()
+    driver = FakeDriver()
+    waited = activator.wait_for_service_worker(driver, "abc", timeout=5)
+    assert waited is not None and waited < 1 and driver.polls == 3
+    assert activator.wait_for_ui(driver, timeout=1) is not None
+    assert activator.wait_for_project(driver, "proj-1", timeout=1) is not None
+    assert activator.wait_for_project(driver, "other", timeout=0.2) is None
+    assert activator.wait_for_service_worker(driver, "zzz", timeout=0.1) is None
+
+
+def test_project_import_streams_validates_and_truncates_runs(monkeypatch, tmp_path):
+    monkeypatch.setattr(project_file, "CHUNK_SIZE", 7)
+    runs = [{"id": f"run-{i}", "workflowId": "wf-1", "status": "success", "startTime": 1000 - i} for i in range(5)]
+    export = {
+        "version": 1,
+        "project": {"id": "proj-1", "name": "P"},
+        "workflows": [{"id": "wf-1", "runs": runs, "steps": [{"id": "s1"}]}, {"id": "wf-2", "runs": []}],
+    }
+    src = tmp_path / "export.json"
+    src.write_text(json.dumps(export, indent=2))
+    dest = tmp_path / "import.json"
+
+    summary = project_file.copy_project(str(src), str(dest))
+    assert summary == {"project_id": "proj-1", "workflows": 2, "runs": 5, "runs_kept": 5}
+    assert json.loads(dest.read_text()) == export
+
+    seen = []
+    summary = project_file.copy_project(str(src), str(dest), keep_runs=2, on_run=lambda run, wf: seen.append((wf, run)))
+    assert summary["runs_kept"] == 2 and len(seen) == 5 and seen[0][0] == "wf-1"
+    copied = json.loads(dest.read_text())
+    assert [r["id"] for r in copied["workflows"][0]["runs"]] == ["run-0", "run-1"]
+    assert copied["workflows"][0]["steps"] == [{"id": "s1"}]
+
+    # an invalid export fails without touching the previous copy
+    bad = tmp_path / "bad.json"
+    bad.write_text('{"project": {"id": "p"}, "workflows": [{"name": "no id", "runs": [')
+    with pytest.raises(ValueError):
+        project_file.copy_project(str(bad), str(dest))
+    bad.write_text('{"project": {"id": "p"}, "workflows": [{"name": "no id"}]}')
+    with pytest.raises(ValueError, match="string id"):
+        project_file.copy_project(str(bad), str(dest))
+    assert json.loads(dest.read_text()) == copied
+    assert not (tmp_path / "import.json.tmp").exists()
+
+
+def test_run_history_extract_query_and_merge(tmp_path, monkeypatch):
+    runs = [
+        {"id": f"run-{i}", "workflowId": "wf-1", "status": "error" if i % 3 == 0 else "success",
+         "trigger": "schedule" if i % 2 else "manual", "startTime": 10000 - i * 10,
+         "endTime": 10000 - i * 10 + i, "steps": [{"id": "s", "duration": "0.01s"}]}
+        for i in range(7)
+    ]
+    export = {"project": {"id": "proj-1"}, "workflows": [{"id": "wf-1", "runs": runs}, {"id": "wf-2"}]}
+    src = tmp_path / "export.json"
+    src.write_text(json.dumps(export))
+    history = RunHistory(str(tmp_path / "runs.sqlite3"))
+
+    summary = extract(str(src), str(tmp_path / "slim.json"), history, keep_runs=1)
+    assert summary["stored"] == 7 and summary["runs_kept"] == 1
+    slim = json.loads((tmp_path / "slim.json").read_text())
+    assert [r["id"] for r in slim["workflows"][0]["runs"]] == ["run-0"]
+
+    assert history.count(workflow_id="wf-1") == 7
+    errors = history.query(workflow_id="wf-1", status="error")
+    assert [r["id"] for r in errors] == ["run-0", "run-3", "run-6"]
+    window = history.query(trigger="manual", since=9950, until=10000)
+    assert [r["id"] for r in window] == ["run-2", "run-4"]
+    assert history.stats() == {"runs": 7, "workflows": {"wf-1": 7}}
+
+    # an export that turns out invalid stores none of its runs
+    monkeypatch.setattr("runyx_bridge.history._BATCH_SIZE", 2)
+    bad = tmp_path / "bad.json"
+    bad.write_text(json.dumps(export).replace('"run-', '"new-').replace('{"id": "wf-2"}', '{"name": "no id"}'))
+    with pytest.raises(ValueError):
+        extract(str(bad), str(tmp_path / "slim.json"), history)
+    assert history.count() == 7
+    assert [r["id"] for r in json.loads((tmp_path / "slim.json").read_text())["workflows"][0]["runs"]] == ["run-0"]
+
+    merge(str(tmp_path / "slim.json"), str(tmp_path / "full.json"), history)
+    full = json.loads((tmp_path / "full.json").read_text())
+    assert full["workflows"][0]["runs"] == runs
+    assert full["workflows"][1] == {"id": "wf-2", "runs": []}
+
+    # the file's copy wins even when the stored one has another startTime
+    history.add({**runs[0], "startTime": 1, "status": "stale"})
+    history.add({**runs[3], "startTime": 99999, "status": "stale"})
+    merge(str(tmp_path / "slim.json"), str(tmp_path / "full.json"), history)
+    merged = json.loads((tmp_path / "full.json").read_text())["workflows"][0]["runs"]
+    assert [r["id"] for r in merged] == ["run-3", "run-0", "run-1", "run-2", "run-4", "run-5", "run-6"]
+    assert merged[1] == runs[0] and merged[0]["status"] == "stale"
+    history.close()
+
+
+def test_receive_runs_batches_writes_and_answers_queries(tmp_path, monkeypatch):
+    ingest = receive_runs("/runs", db=str(tmp_path / "runs.sqlite3"), batch_size=50, flush_interval=5, max_pending=100)
+    client = make_test_app().test_client()
+    runs = [
+        {"id": f"r{i}", "status": "error" if i % 10 == 0 else "success", "startTime": 1000 + i, "endTime": 1000 + i + i * 10}
+        for i in range(1, 21)
+    ]
+
+    assert client.post("/runs", json={"workflowId": "wf-1", "runs": runs}).get_json()["result"] == {"queued": 20}
+    assert client.post("/runs", json={"id": "r21", "workflowId": "wf-2", "duration": "1.5s"}).get_json()["result"] == {"queued": 1}
+    assert client.post("/runs", json=[{"id": "no-workflow"}]).status_code == 400
+    assert client.post("/runs", json=[{"id": f"x{i}", "workflowId": "wf-3"} for i in range(101)]).status_code == 429
+    assert ingest.flush(timeout=5)
+
+    errors = client.get("/runs?workflowId=wf-1&status=error").get_json()["result"]
+    assert [run["id"] for run in errors] == ["r20", "r10"]
+    assert [run["id"] for run in client.get("/runs?since=1019&limit=5").get_json()["result"]] == ["r20", "r19"]
+    assert client.get("/runs?workflowId=wf-1&limit=0").status_code == 400
+    monkeypatch.setattr("runyx_bridge.run_ingest.MAX_LIMIT", 3)
+    assert len(client.get("/runs?limit=5000").get_json()["result"]) == 3
+    assert client.get("/runs?limit=-1").status_code == 400
+    stats = client.get("/runs/stats?workflowId=wf-1").get_json()["result"]
+    assert stats["count"] == 20 and stats["by_status"] == {"error": 2, "success": 18}
+    assert (stats["p50_ms"], stats["p95_ms"]) == (100, 190)
+    assert stats["ingest"]["committed"] == 21 and stats["ingest"]["pending"] == 0